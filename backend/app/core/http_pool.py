@@ -0,0 +1,120 @@
+import threading
+from collections import OrderedDict
+
+import aiohttp
+from dotenv import load_dotenv
+from openai import OpenAI
+import os
+
+load_dotenv()
+
+# Connections per provider session. Phases stream one at a time per
+# generation, so this bounds concurrent generations per worker and provider
+LLM_POOL_LIMIT = int(os.getenv("LLM_POOL_LIMIT", "100"))
+# Seconds an idle connection is kept open for the next phase or request
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+# No total timeout: reasoning models may think for minutes before streaming,
+# and a stream may run longer still
+LLM_CONNECT_TIMEOUT_SECONDS = 10
+LLM_READ_TIMEOUT_SECONDS = 300
+# SDK clients for user-supplied API keys kept per worker
+MAX_USER_CLIENTS = int(os.getenv("MAX_USER_CLIENTS", "64"))
+
+# One pooled session per provider and worker process, created lazily because
+# an aiohttp.ClientSession must be bound to the running event loop
+_sessions: dict[str, aiohttp.ClientSession] = {}
+
+
+def get_llm_session(provider: str) -> aiohttp.ClientSession:
+    """
+    Returns the long-lived pooled session for an LLM provider. Connections
+    are kept alive between the phases of a generation and across requests,
+    so only the first call to a provider pays for DNS, TCP and TLS setup.
+
+    Args:
+        provider (str): Provider name, e.g. "openai" or "deepseek"
+
+    Returns:
+        aiohttp.ClientSession: The provider's session, never to be closed by callers
+    """
+    session = _sessions.get(provider)
+    if session is None or session.closed:
+        session = _sessions[provider] = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(
+                limit=LLM_POOL_LIMIT,
+                limit_per_host=LLM_POOL_LIMIT,
+                ttl_dns_cache=300,
+                keepalive_timeout=LLM_KEEPALIVE_SECONDS,
+                enable_cleanup_closed=True,
+            ),
+            timeout=aiohttp.ClientTimeout(
+                total=None,
+                sock_connect=LLM_CONNECT_TIMEOUT_SECONDS,
+                sock_read=LLM_READ_TIMEOUT_SECONDS,
+            ),
+        )
+    return session
+
+
+class OpenAIClientPool:
+    """
+    LRU pool of OpenAI SDK clients for user-supplied API keys, so repeat
+    requests with the same key reuse the client's connection pool instead
+    of building a new client per call. Evicted clients are closed.
+
+    Thread safe: the SDK's blocking calls may run in worker threads.
+    """
+
+    def __init__(self, max_clients: int = MAX_USER_CLIENTS):
+        self.max_clients = max_clients
+        self._clients: OrderedDict[tuple[str, str | None], OpenAI] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, api_key: str, base_url: str | None = None) -> OpenAI:
+        """Returns the pooled client for api_key and base_url, creating it if needed."""
+        key = (api_key, base_url)
+        evicted = None
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                self.hits += 1
+                return client
+            self.misses += 1
+            client = self._clients[key] = OpenAI(api_key=api_key, base_url=base_url)
+            if len(self._clients) > self.max_clients:
+                _, evicted = self._clients.popitem(last=False)
+        if evicted is not None:
+            evicted.close()
+        return client
+
+    def close(self):
+        """Closes every pooled client."""
+        with self._lock:
+            clients = list(self._clients.values())
+            self._clients.clear()
+        for client in clients:
+            client.close()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "max_clients": self.max_clients,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+user_client_pool = OpenAIClientPool()
+
+
+async def close_llm_sessions():
+    """Closes the pooled LLM sessions and user clients. Called on application shutdown."""
+    sessions = list(_sessions.values())
+    _sessions.clear()
+    for session in sessions:
+        if not session.closed:
+            await session.close()
+    user_client_pool.close()
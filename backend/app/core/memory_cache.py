@@ -0,0 +1,112 @@
+import json
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Hashable
+
+# Rough per-entry bookkeeping cost (key, tuple, OrderedDict node) in bytes
+ENTRY_OVERHEAD_BYTES = 200
+
+
+class ByteBudgetCache:
+    """
+    In-process LRU cache bounded by the total size of its entries rather than
+    their count, with a per-entry time to live.
+
+    Values must be JSON serializable. They are stored as zlib-compressed JSON,
+    so large file trees cost a fraction of their in-memory size and the budget
+    reflects what is actually held. Every hit returns a fresh copy.
+
+    Not thread safe: use it from the event loop only.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float | None = None):
+        """
+        Args:
+            max_bytes (int): Upper bound for the summed size of all entries
+            ttl (float | None): Default seconds an entry stays valid, None for no expiry
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: OrderedDict[Hashable, tuple[bytes, float | None]] = (
+            OrderedDict()
+        )
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Any | None:
+        """Returns the cached value for key, or None if absent or expired."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] is not None and entry[1] <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return json.loads(zlib.decompress(entry[0]))
+
+    def set(self, key: Hashable, value: Any, ttl: float | None = None):
+        """
+        Stores value under key, evicting least recently used entries until the
+        cache fits its byte budget. Values larger than the whole budget are not
+        stored.
+
+        Args:
+            key (Hashable): Cache key
+            value (Any): JSON serializable value
+            ttl (float | None): Seconds the entry stays valid, defaults to the cache ttl
+        """
+        blob = zlib.compress(json.dumps(value).encode("utf-8"))
+        if key in self._entries:
+            self._remove(key)
+        if len(blob) + ENTRY_OVERHEAD_BYTES > self.max_bytes:
+            return
+
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = time.monotonic() + ttl if ttl is not None else None
+        self._entries[key] = (blob, expires_at)
+        self._bytes += len(blob) + ENTRY_OVERHEAD_BYTES
+
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        """Removes key from the cache if present."""
+        if key in self._entries:
+            self._remove(key)
+
+    def clear(self):
+        """Removes every entry, keeping the counters."""
+        self._entries.clear()
+        self._bytes = 0
+
+    def _remove(self, key: Hashable):
+        blob, _ = self._entries.pop(key)
+        self._bytes -= len(blob) + ENTRY_OVERHEAD_BYTES
+
+    def stats(self) -> dict:
+        """Returns size and hit/miss/eviction counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
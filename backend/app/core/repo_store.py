@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import time
+import zlib
+from contextlib import contextmanager
+from typing import Iterator
+from dotenv import load_dotenv
+
+load_dotenv()
+
+REPO_CACHE_PATH = os.getenv("REPO_CACHE_PATH", ".cache/repo_cache.sqlite3")
+# Older commits of a repo are rarely requested again, keep only the newest few
+SNAPSHOTS_PER_REPO = 3
+
+
+class RepoStore:
+    """
+    Persistent on-disk cache of repository data keyed by owner, repo and commit SHA.
+
+    Alongside the snapshots it remembers the last seen HEAD commit of each repo
+    and the ETag GitHub returned for it, so a repo can be revalidated with a
+    conditional request that costs a 304 instead of a full fetch.
+
+    Snapshots are only served to a store created with the same tree_version,
+    so trees listed in another format or filtered by other rules are fetched
+    again and replaced rather than served until their commit is pruned.
+
+    All methods block on disk I/O; call them through asyncio.to_thread from
+    async code. A connection is opened per call so the store is safe to use
+    from any thread and from several worker processes at once.
+    """
+
+    def __init__(self, path: str = REPO_CACHE_PATH, tree_version: str = ""):
+        """
+        Args:
+            path (str): SQLite database file
+            tree_version (str): Identifies how stored file trees were listed
+                and filtered
+        """
+        self.path = path
+        self.tree_version = tree_version
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS heads (
+                    owner TEXT NOT NULL,
+                    repo TEXT NOT NULL,
+                    commit_sha TEXT NOT NULL,
+                    etag TEXT,
+                    PRIMARY KEY (owner, repo)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS snapshots (
+                    owner TEXT NOT NULL,
+                    repo TEXT NOT NULL,
+                    commit_sha TEXT NOT NULL,
+                    default_branch TEXT NOT NULL,
+                    file_tree BLOB NOT NULL,
+                    readme BLOB NOT NULL,
+                    private INTEGER NOT NULL DEFAULT 1,
+                    tree_version TEXT NOT NULL DEFAULT '',
+                    created_at REAL NOT NULL,
+                    PRIMARY KEY (owner, repo, commit_sha)
+                )
+                """
+            )
+            # Stores created before visibility was tracked: treat rows as private
+            columns = [row[1] for row in conn.execute("PRAGMA table_info(snapshots)")]
+            if "private" not in columns:
+                conn.execute(
+                    "ALTER TABLE snapshots ADD COLUMN private INTEGER NOT NULL DEFAULT 1"
+                )
+            # Stores created before trees were versioned: never served again
+            if "tree_version" not in columns:
+                conn.execute(
+                    "ALTER TABLE snapshots ADD COLUMN tree_version TEXT NOT NULL DEFAULT ''"
+                )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:  # commits on success, rolls back on error
+                yield conn
+        finally:
+            conn.close()
+
+    def get_head(self, owner: str, repo: str) -> tuple[str, str | None] | None:
+        """
+        Returns the last seen (commit_sha, etag) of the repo's HEAD, or None.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT commit_sha, etag FROM heads WHERE owner = ? AND repo = ?",
+                (owner.lower(), repo.lower()),
+            ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    def set_head(self, owner: str, repo: str, commit_sha: str, etag: str | None):
+        """Records the current HEAD commit of the repo and its ETag."""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO heads (owner, repo, commit_sha, etag) VALUES (?, ?, ?, ?)",
+                (owner.lower(), repo.lower(), commit_sha, etag),
+            )
+
+    def get_snapshot(self, owner: str, repo: str, commit_sha: str) -> dict | None:
+        """
+        Returns the stored github data for the commit, or None if it was never
+        fetched, has been pruned or was stored with another tree_version.
+        """
+        with self._connect() as conn:
+            row = conn.execute(
+                """
+                SELECT default_branch, file_tree, readme, private FROM snapshots
+                WHERE owner = ? AND repo = ? AND commit_sha = ? AND tree_version = ?
+                """,
+                (owner.lower(), repo.lower(), commit_sha, self.tree_version),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "default_branch": row[0],
+            "file_tree": zlib.decompress(row[1]).decode("utf-8"),
+            "readme": zlib.decompress(row[2]).decode("utf-8"),
+            "private": bool(row[3]),
+            "commit_sha": commit_sha,
+        }
+
+    def put_snapshot(self, owner: str, repo: str, commit_sha: str, github_data: dict):
+        """
+        Stores github data for the commit and prunes all but the newest
+        SNAPSHOTS_PER_REPO commits of the repo.
+        """
+        owner, repo = owner.lower(), repo.lower()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO snapshots
+                (owner, repo, commit_sha, default_branch, file_tree, readme, private,
+                 tree_version, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    owner,
+                    repo,
+                    commit_sha,
+                    github_data["default_branch"],
+                    zlib.compress(github_data["file_tree"].encode("utf-8")),
+                    zlib.compress(github_data["readme"].encode("utf-8")),
+                    int(github_data.get("private", True)),
+                    self.tree_version,
+                    time.time(),
+                ),
+            )
+            conn.execute(
+                """
+                DELETE FROM snapshots WHERE owner = ? AND repo = ? AND commit_sha NOT IN (
+                    SELECT commit_sha FROM snapshots WHERE owner = ? AND repo = ?
+                    ORDER BY created_at DESC LIMIT ?
+                )
+                """,
+                (owner, repo, owner, repo, SNAPSHOTS_PER_REPO),
+            )
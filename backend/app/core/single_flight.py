@@ -0,0 +1,111 @@
+import asyncio
+from contextlib import aclosing
+from typing import AsyncGenerator, AsyncIterator, Awaitable, Callable, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls: while a call for a key is in flight, other
+    callers with the same key await its result instead of starting their own.
+    """
+
+    def __init__(self):
+        self._calls: dict[Hashable, asyncio.Future] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        """
+        Runs fn() unless a call for key is already in flight, and returns its
+        result. Exceptions are raised to every waiting caller.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            future = asyncio.ensure_future(fn())
+            self._calls[key] = future
+            future.add_done_callback(lambda _: self._calls.pop(key, None))
+        # A cancelled caller must not cancel the call the others are waiting on
+        return await asyncio.shield(future)
+
+
+class _Broadcast:
+    """Runs a stream once, buffering every item for current and late subscribers."""
+
+    def __init__(self, source: AsyncIterator[str]):
+        self._buffer: list[str] = []
+        self._done = False
+        self._changed = asyncio.Condition()
+        self._subscribers = 0
+        self._task = asyncio.create_task(self._pump(source))
+
+    @property
+    def closed(self) -> bool:
+        """True once the stream finished or was cancelled; no point joining it."""
+        return self._done or self._task.cancelled() or self._task.cancelling() > 0
+
+    async def _pump(self, source: AsyncIterator[str]):
+        try:
+            async for item in source:
+                self._buffer.append(item)
+                async with self._changed:
+                    self._changed.notify_all()
+        except Exception as e:
+            print(f"Error in shared stream: {str(e)}")
+        finally:
+            self._done = True
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def subscribe(self) -> AsyncGenerator[str, None]:
+        self._subscribers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self._buffer):
+                    yield self._buffer[index]
+                    index += 1
+                if self._done:
+                    return
+                async with self._changed:
+                    await self._changed.wait_for(
+                        lambda: self._done or index < len(self._buffer)
+                    )
+        finally:
+            self._subscribers -= 1
+            # Nobody is listening any more, stop paying for the upstream work
+            if self._subscribers == 0 and not self._done:
+                self._task.cancel()
+
+
+class StreamSingleFlight:
+    """
+    Shares one run of an async generator between all concurrent subscribers
+    with the same key. Subscribers joining late first receive every item
+    produced so far, then follow the live stream. The run is cancelled once
+    its last subscriber disconnects.
+    """
+
+    def __init__(self):
+        self._broadcasts: dict[Hashable, _Broadcast] = {}
+
+    def __len__(self) -> int:
+        return len(self._broadcasts)
+
+    async def subscribe(
+        self, key: Hashable, factory: Callable[[], AsyncIterator[str]]
+    ) -> AsyncGenerator[str, None]:
+        """
+        Yields the items of the stream for key, starting it with factory() if
+        no run for key is in flight.
+        """
+        broadcast = self._broadcasts.get(key)
+        if broadcast is None or broadcast.closed:
+            broadcast = _Broadcast(factory())
+            self._broadcasts[key] = broadcast
+        try:
+            async with aclosing(broadcast.subscribe()) as items:
+                async for item in items:
+                    yield item
+        finally:
+            if broadcast.closed and self._broadcasts.get(key) is broadcast:
+                del self._broadcasts[key]
@@ -2,15 +2,26 @@ from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
-from app.routers import generate, modify
+from app.routers import generate, metrics, modify
 from app.core.limiter import limiter
+from app.core.http_pool import close_llm_sessions
+from app.services.github_service import close_github_session
 from typing import cast
 from starlette.exceptions import ExceptionMiddleware
 from api_analytics.fastapi import Analytics
+from contextlib import asynccontextmanager
 import os
 
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Release pooled upstream connections held by this worker
+    await close_github_session()
+    await close_llm_sessions()
+
+
+app = FastAPI(lifespan=lifespan)
 
 
 origins = ["http://localhost:3000", "http://localhost:6001", "https://gitdiagram.com"]
@@ -34,6 +45,7 @@ app.add_exception_handler(
 
 app.include_router(generate.router)
 app.include_router(modify.router)
+app.include_router(metrics.router)
 
 
 @app.get("/")
@@ -16,7 +16,7 @@
 SYSTEM_FIRST_PROMPT = """
 You are tasked with explaining to a principal software engineer how to draw the best and most accurate system design diagram / architecture of a given project. This explanation should be tailored to the specific project's purpose and structure. To accomplish this, you will be provided with two key pieces of information:
 
-1. The complete and entire file tree of the project including all directory and file names, which will be enclosed in <file_tree> tags in the users message.
+1. The complete and entire file tree of the project including all directory and file names, which will be enclosed in <file_tree> tags in the users message. The file tree may be written as an indented tree: each entry belongs to the closest directory above it with less indentation, directory names end with "/", and a directory that only contains a single subdirectory is joined with it on one line (e.g. "src/main/java/"). The full path of an entry is the names of its directories followed by its own name.
 
 2. The README file of the project, which will be enclosed in <readme> tags in the users message.
 
@@ -69,7 +69,7 @@ You are tasked with mapping key components of a system design to their correspon
 
 First, carefully read the system design explanation which will be enclosed in <explanation> tags in the users message.
 
-Then, examine the file tree of the project which will be enclosed in <file_tree> tags in the users message.
+Then, examine the file tree of the project which will be enclosed in <file_tree> tags in the users message. The file tree may be written as an indented tree: each entry belongs to the closest directory above it with less indentation, directory names end with "/", and a directory that only contains a single subdirectory is joined with it on one line (e.g. "src/main/java/"). The full path of an entry is the names of its directories followed by its own name. Always write mapped paths in full, from the root of the project.
 
 Your task is to analyze the system design explanation and identify key components, modules, or services mentioned. Then, try your best to map these components to what you believe could be their corresponding directories and files in the provided file tree.
 
@@ -1,9 +1,29 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import StreamingResponse
 from dotenv import load_dotenv
-from app.services.github_service import GitHubService
+from app.services.repo_data import get_cached_github_data, prompt_tree_cache
+from app.services.diagram_cache import (
+    cached_phase_stream,
+    diagram_result_cache,
+    diagram_result_key,
+)
+from app.core.single_flight import StreamSingleFlight
 from app.services.o4_mini_openai_service import OpenAIo4Service
 from app.services.deepseek_service import DeepSeekService
+from app.services.llm_router import LLMProvider, llm_router
+from app.utils.file_tree_format import (
+    FILE_TREE_FORMAT,
+    format_file_tree,
+    summarize_file_tree,
+)
+from app.utils.instructions import is_presentation_only
+from app.utils.readme_reducer import ReducedReadme, reduce_readme
+from app.utils.token_counter import (
+    bounded_token_count,
+    count_tokens,
+    count_tokens_async,
+    estimate_tokens,
+)
 from app.prompts import (
     SYSTEM_FIRST_PROMPT,
     SYSTEM_SECOND_PROMPT,
@@ -12,9 +32,10 @@ from app.prompts import (
 )
 from anthropic._exceptions import RateLimitError
 from pydantic import BaseModel
-from functools import lru_cache
+from contextlib import aclosing
 import re
 import json
+import hashlib
 import asyncio
 import os
 
@@ -30,21 +51,55 @@ router = APIRouter(prefix="/generate", tags=["DeepSeek & OpenAI"])
 o4_service = OpenAIo4Service()
 deepseek_service = DeepSeekService()
 
+# Token counts the endpoints decide on
+DEEPSEEK_THRESHOLD = 150000  # Use DeepSeek above this
+OPENAI_WALLET_LIMIT = 50000  # Above this OpenAI needs the user's own key
+OPENAI_MAX_TOKENS = 195000
+DEEPSEEK_MAX_TOKENS = 1000000  # DeepSeek can handle ~1M tokens
+
+# Summarize the file trees of repos too large for o4-mini instead of
+# switching them to DeepSeek or rejecting them
+SUMMARIZE_LARGE_TREES = os.getenv("SUMMARIZE_LARGE_TREES", "true").lower() == "true"
+# Below this budget a summary would say too little to be worth it
+MIN_TREE_TOKEN_BUDGET = 2000
+
+# Providers the pipeline routes phases to, in order of preference
+llm_router.register(
+    LLMProvider(
+        name="OpenAI o4-mini",
+        model="o4-mini",
+        max_tokens=OPENAI_MAX_TOKENS,
+        wallet_limit=OPENAI_WALLET_LIMIT,
+        preferred_up_to=DEEPSEEK_THRESHOLD,
+        accepts_user_key=True,
+        reasoning=True,
+        stream=lambda system_prompt, data, api_key, reasoning_effort: o4_service.call_o4_api_stream(
+            system_prompt=system_prompt,
+            data=data,
+            api_key=api_key,
+            reasoning_effort=reasoning_effort,
+        ),
+    )
+)
+llm_router.register(
+    LLMProvider(
+        name="DeepSeek",
+        model="deepseek-chat",
+        max_tokens=DEEPSEEK_MAX_TOKENS,
+        # No wallet limit below the context size due to lower cost
+        wallet_limit=DEEPSEEK_MAX_TOKENS,
+        preferred_up_to=DEEPSEEK_MAX_TOKENS,
+        accepts_user_key=False,
+        reasoning=False,
+        stream=lambda system_prompt, data, api_key, reasoning_effort: deepseek_service.call_deepseek_api_stream(
+            system_prompt=system_prompt,
+            data=data,
+            api_key=api_key,
+        ),
+    )
+)
 
-# cache github data to avoid double API calls from cost and generate
-@lru_cache(maxsize=100)
-def get_cached_github_data(username: str, repo: str, github_pat: str | None = None):
-    # Create a new service instance for each call with the appropriate PAT
-    current_github_service = GitHubService(pat=github_pat)
-
-    default_branch = current_github_service.get_default_branch(username, repo)
-    if not default_branch:
-        default_branch = "main"  # fallback value
-
-    file_tree = current_github_service.get_github_file_paths_as_list(username, repo)
-    readme = current_github_service.get_github_readme(username, repo)
-
-    return {"default_branch": default_branch, "file_tree": file_tree, "readme": readme}
+generation_flights = StreamSingleFlight()
 
 
 class ApiRequest(BaseModel):
@@ -53,6 +108,55 @@ class ApiRequest(BaseModel):
     instructions: str = ""
     api_key: str | None = None
     github_pat: str | None = None
+    bypass_cache: bool = False
+
+
+async def prompt_readme(github_data: dict) -> ReducedReadme:
+    """
+    Returns the README as it is sent to the model, reduced to what explains
+    the architecture and to README_TOKEN_BUDGET, and logs the tokens saved.
+    """
+    reduced = await asyncio.to_thread(reduce_readme, github_data["readme"])
+    print(
+        f"README reduced from {reduced.original_tokens:,} to {reduced.tokens:,} "
+        f"tokens ({reduced.tokens_saved:,} saved)"
+    )
+    return reduced
+
+
+async def prompt_file_tree(github_data: dict, readme: str, api_key: str | None) -> str:
+    """
+    Returns the file tree as it is sent to the model: in the configured
+    format, and summarized when the repository would not otherwise fit
+    o4-mini next to readme within what the request may use, i.e. the wallet
+    limit without an API key and the DeepSeek switch with one. Summaries are
+    always in the compact format, whatever FILE_TREE_FORMAT says.
+
+    Both are memoized per commit in prompt_tree_cache, so /stream and the
+    /cost call before it format a large tree only once.
+    """
+    tree_key = (github_data["commit_sha"], FILE_TREE_FORMAT, None)
+    file_tree = prompt_tree_cache.get(tree_key)
+    if file_tree is None:
+        file_tree = await asyncio.to_thread(format_file_tree, github_data["file_tree"])
+        prompt_tree_cache.set(tree_key, file_tree)
+    if not SUMMARIZE_LARGE_TREES:
+        return file_tree
+
+    limit = DEEPSEEK_THRESHOLD if api_key else OPENAI_WALLET_LIMIT
+    # Counted with the newline that joins the tree and README
+    budget = limit - await count_tokens_async(readme) - 1
+    if budget < MIN_TREE_TOKEN_BUDGET or estimate_tokens(file_tree).upper <= budget:
+        return file_tree
+
+    summary_key = (github_data["commit_sha"], FILE_TREE_FORMAT, budget)
+    summary = prompt_tree_cache.get(summary_key)
+    if summary is None:
+        summary = await asyncio.to_thread(
+            summarize_file_tree, github_data["file_tree"], budget
+        )
+        prompt_tree_cache.set(summary_key, summary)
+    return summary
 
 
 @router.post("/cost")
@@ -60,17 +164,28 @@ class ApiRequest(BaseModel):
 async def get_generation_cost(request: Request, body: ApiRequest):
     try:
         # Get file tree and README content
-        github_data = get_cached_github_data(body.username, body.repo, body.github_pat)
-        file_tree = github_data["file_tree"]
-        readme = github_data["readme"]
-
-        # Calculate combined token count using DeepSeek service
-        file_tree_tokens = deepseek_service.count_tokens(file_tree)
-        readme_tokens = deepseek_service.count_tokens(readme)
-        total_tokens = file_tree_tokens * 2 + readme_tokens + 3000
+        github_data = await get_cached_github_data(
+            body.username, body.repo, body.github_pat
+        )
+        # Priced as it is sent to the model
+        reduced_readme = await prompt_readme(github_data)
+        readme = reduced_readme.text
+        file_tree = await prompt_file_tree(github_data, readme, body.api_key)
+
+        # Estimate the combined token count, precise enough to pick the
+        # provider; large inputs are only encoded in full near the threshold
+        total_tokens = (
+            await bounded_token_count(
+                [file_tree, readme],
+                lambda file_tree_tokens, readme_tokens: file_tree_tokens * 2
+                + readme_tokens
+                + 3000,
+                thresholds=[DEEPSEEK_THRESHOLD],
+            )
+        ).value
 
         # Check if we should use DeepSeek or OpenAI based on context length
-        use_deepseek = total_tokens > 150000  # Use DeepSeek for large repos
+        use_deepseek = total_tokens > DEEPSEEK_THRESHOLD  # Use DeepSeek for large repos
         
         if use_deepseek:
             # DeepSeek pricing (much cheaper and larger context)
@@ -95,6 +210,7 @@ async def get_generation_cost(request: Request, body: ApiRequest):
             "cost": cost_string, 
             "provider": provider,
             "token_count": total_tokens,
+            "readme_tokens_saved": reduced_readme.tokens_saved,
             "use_deepseek": use_deepseek
         }
     except Exception as e:
@@ -127,6 +243,237 @@ def process_click_events(diagram: str, username: str, repo: str, branch: str) ->
     return re.sub(click_pattern, replace_path, diagram)
 
 
+async def generation_events(body: ApiRequest, github_data: dict):
+    """
+    Runs the three-phase diagram pipeline for a repository and yields its
+    progress as server-sent events.
+    """
+    try:
+        default_branch = github_data["default_branch"]
+        # Reduced once, sent to phases 1 and 2 and counted as sent
+        readme = (await prompt_readme(github_data)).text
+        file_tree = await prompt_file_tree(github_data, readme, body.api_key)
+
+        # Send initial status
+        yield f"data: {json.dumps({'status': 'started', 'message': 'Starting generation process...'})}\n\n"
+        await asyncio.sleep(0.1)
+
+        # Token count check and service selection. The file tree and README
+        # are counted separately, plus the newline joining them, so the
+        # memoized counts from /cost are reused. Large inputs are estimated
+        # and only encoded in full when the estimate is near a limit.
+        token_count = (
+            await bounded_token_count(
+                [file_tree, readme],
+                lambda file_tree_tokens, readme_tokens: file_tree_tokens
+                + readme_tokens
+                + 1,
+                thresholds=[
+                    OPENAI_WALLET_LIMIT,
+                    DEEPSEEK_THRESHOLD,
+                    OPENAI_MAX_TOKENS,
+                    DEEPSEEK_MAX_TOKENS,
+                ],
+            )
+        ).value
+
+        # The provider configured for this size decides the limits, the
+        # result cache key and, unless adaptive routing moves a phase away
+        # from it, runs all three phases like /cost assumes
+        preferred = llm_router.preferred(token_count)
+
+        # Replay a finished diagram for the same commit, instructions and
+        # model. Only diagrams whose phases all ran on the preferred provider
+        # are stored, see the end of the pipeline
+        result_key = diagram_result_key(
+            body.username,
+            body.repo,
+            github_data["commit_sha"],
+            body.instructions,
+            preferred.model,
+        )
+        cached_result = (
+            None if body.bypass_cache else diagram_result_cache.get(result_key)
+        )
+        if cached_result is not None:
+            yield f"data: {json.dumps({'status': 'complete', **cached_result})}\n\n"
+            return
+
+        max_tokens = preferred.max_tokens
+        wallet_limit = preferred.wallet_limit
+
+        if wallet_limit < token_count < max_tokens and not body.api_key:
+            yield f"data: {json.dumps({'error': f'File tree and README combined exceeds token limit ({wallet_limit:,}). Current size: {token_count:,} tokens. This GitHub repository is too large for my wallet, but you can continue by providing your own OpenAI API key or the system will automatically use DeepSeek for large repositories.'})}\n\n"
+            return
+        elif token_count > max_tokens:
+            yield f"data: {json.dumps({'error': f'Repository is too large (>{max_tokens//1000}k tokens) for analysis. {preferred.name} max context length exceeded. Current size: {token_count:,} tokens.'})}\n\n"
+            return
+
+        # Provider that answered each phase, cached or not
+        served: list[LLMProvider] = []
+
+        def phase_stream(provider, phase_tokens, system_prompt, data, reasoning_effort):
+            # Phase outputs are cached per provider, the router only sees
+            # and times calls that actually reach it. Outputs are looked up
+            # under the provider the phase was routed to and stored under the
+            # one that answered, which differs when a hedge wins
+            phase = len(served)
+            served.append(provider)
+
+            def on_answer(answered: LLMProvider):
+                served[phase] = answered
+
+            return cached_phase_stream(
+                provider.phase_key(system_prompt, data, reasoning_effort),
+                llm_router.stream(
+                    provider,
+                    system_prompt,
+                    data,
+                    body.api_key,
+                    reasoning_effort,
+                    phase_tokens,
+                    on_answer,
+                ),
+                bypass_cache=body.bypass_cache,
+                store_key=lambda: served[phase].phase_key(
+                    system_prompt, data, reasoning_effort
+                ),
+            )
+
+        # Each phase goes to the provider the router picks for the run and
+        # its own input size, given current provider performance
+        provider = llm_router.select(token_count, body.api_key, preferred)
+
+        # Notify user which service is being used
+        yield f"data: {json.dumps({'status': 'service_selected', 'message': f'Using {provider.name} for this repository ({token_count:,} tokens)'})}\n\n"
+        await asyncio.sleep(0.1)
+
+        # Prepare prompts. Instructions that only restyle the diagram are left
+        # to phase 3, so phases 1 and 2 send what a run without instructions
+        # sends and reuse its cached outputs: a tweak costs one round trip
+        first_instructions = (
+            "" if is_presentation_only(body.instructions) else body.instructions
+        )
+        first_system_prompt = SYSTEM_FIRST_PROMPT
+        third_system_prompt = SYSTEM_THIRD_PROMPT
+        if first_instructions:
+            first_system_prompt = (
+                first_system_prompt
+                + "\n"
+                + ADDITIONAL_SYSTEM_INSTRUCTIONS_PROMPT
+            )
+        if body.instructions:
+            third_system_prompt = (
+                third_system_prompt
+                + "\n"
+                + ADDITIONAL_SYSTEM_INSTRUCTIONS_PROMPT
+            )
+
+        # Phase 1: Get explanation
+        yield f"data: {json.dumps({'status': 'explanation_sent', 'message': f'Sending explanation request to {provider.name}...'})}\n\n"
+        await asyncio.sleep(0.1)
+        yield f"data: {json.dumps({'status': 'explanation', 'message': 'Analyzing repository structure...'})}\n\n"
+        explanation = ""
+        first_data = {
+            "file_tree": file_tree,
+            "readme": readme,
+            "instructions": first_instructions,
+        }
+
+        async for chunk in phase_stream(
+            provider, token_count, first_system_prompt, first_data, "medium"
+        ):
+            explanation += chunk
+            yield f"data: {json.dumps({'status': 'explanation_chunk', 'chunk': chunk})}\n\n"
+
+        if "BAD_INSTRUCTIONS" in explanation:
+            yield f"data: {json.dumps({'error': 'Invalid or unclear instructions provided'})}\n\n"
+            return
+
+        # Phase 2: Get component mapping. Its input is the file tree and the
+        # explanation, at most the README smaller than phase 1 plus that
+        second_tokens = token_count + count_tokens(explanation)
+        provider = llm_router.select(second_tokens, body.api_key, preferred)
+        yield f"data: {json.dumps({'status': 'mapping_sent', 'message': f'Sending component mapping request to {provider.name}...'})}\n\n"
+        await asyncio.sleep(0.1)
+        yield f"data: {json.dumps({'status': 'mapping', 'message': 'Creating component mapping...'})}\n\n"
+        full_second_response = ""
+        second_data = {"explanation": explanation, "file_tree": file_tree}
+
+        async for chunk in phase_stream(
+            provider, second_tokens, SYSTEM_SECOND_PROMPT, second_data, "low"
+        ):
+            full_second_response += chunk
+            yield f"data: {json.dumps({'status': 'mapping_chunk', 'chunk': chunk})}\n\n"
+
+        # i dont think i need this anymore? but keep it here for now
+        # Extract component mapping
+        start_tag = "<component_mapping>"
+        end_tag = "</component_mapping>"
+        component_mapping_text = full_second_response[
+            full_second_response.find(start_tag) : full_second_response.find(
+                end_tag
+            )
+        ]
+
+        # Phase 3: Generate Mermaid diagram
+        third_data = {
+            "explanation": explanation,
+            "component_mapping": component_mapping_text,
+            "instructions": body.instructions,
+        }
+        third_tokens = (
+            count_tokens(explanation)
+            + count_tokens(component_mapping_text)
+            + count_tokens(body.instructions)
+        )
+        provider = llm_router.select(third_tokens, body.api_key, preferred)
+        yield f"data: {json.dumps({'status': 'diagram_sent', 'message': f'Sending diagram generation request to {provider.name}...'})}\n\n"
+        await asyncio.sleep(0.1)
+        yield f"data: {json.dumps({'status': 'diagram', 'message': 'Generating diagram...'})}\n\n"
+        mermaid_code = ""
+
+        async for chunk in phase_stream(
+            provider, third_tokens, third_system_prompt, third_data, "low"
+        ):
+            mermaid_code += chunk
+            yield f"data: {json.dumps({'status': 'diagram_chunk', 'chunk': chunk})}\n\n"
+
+        # Process final diagram
+        mermaid_code = mermaid_code.replace("```mermaid", "").replace("```", "")
+        if "BAD_INSTRUCTIONS" in mermaid_code:
+            yield f"data: {json.dumps({'error': 'Invalid or unclear instructions provided'})}\n\n"
+            return
+
+        processed_diagram = process_click_events(
+            mermaid_code, body.username, body.repo, default_branch
+        )
+
+        # The result key names the preferred model, so a diagram that adaptive
+        # routing or a hedge moved to another provider is not stored, and so
+        # never replayed as the preferred model's result
+        if all(answered.name == preferred.name for answered in served):
+            diagram_result_cache.set(
+                result_key,
+                {
+                    "diagram": processed_diagram,
+                    "explanation": explanation,
+                    "mapping": component_mapping_text,
+                },
+            )
+
+        # Send final result
+        yield f"data: {json.dumps({
+            'status': 'complete',
+            'diagram': processed_diagram,
+            'explanation': explanation,
+            'mapping': component_mapping_text
+        })}\n\n"
+
+    except Exception as e:
+        yield f"data: {json.dumps({'error': str(e)})}\n\n"
+
+
 @router.post("/stream")
 async def generate_stream(request: Request, body: ApiRequest):
     try:
@@ -146,178 +493,32 @@ async def generate_stream(request: Request, body: ApiRequest):
         async def event_generator():
             try:
                 # Get cached github data
-                github_data = get_cached_github_data(
+                github_data = await get_cached_github_data(
                     body.username, body.repo, body.github_pat
                 )
-                default_branch = github_data["default_branch"]
-                file_tree = github_data["file_tree"]
-                readme = github_data["readme"]
-
-                # Send initial status
-                yield f"data: {json.dumps({'status': 'started', 'message': 'Starting generation process...'})}\n\n"
-                await asyncio.sleep(0.1)
-
-                # Token count check and service selection
-                combined_content = f"{file_tree}\n{readme}"
-                token_count = deepseek_service.count_tokens(combined_content)
-                
-                # Determine which service to use based on token count
-                use_deepseek = token_count > 150000
-                service = deepseek_service if use_deepseek else o4_service
-                service_name = "DeepSeek" if use_deepseek else "OpenAI o4-mini"
-                
-                # Updated limits for DeepSeek (much larger context window)
-                max_tokens = 1000000 if use_deepseek else 195000  # DeepSeek can handle ~1M tokens
-                wallet_limit = 500000 if use_deepseek else 50000  # Higher limit for DeepSeek due to lower cost
-
-                if wallet_limit < token_count < max_tokens and not body.api_key and not use_deepseek:
-                    yield f"data: {json.dumps({'error': f'File tree and README combined exceeds token limit ({wallet_limit:,}). Current size: {token_count:,} tokens. This GitHub repository is too large for my wallet, but you can continue by providing your own OpenAI API key or the system will automatically use DeepSeek for large repositories.'})}\n\n"
-                    return
-                elif token_count > max_tokens:
-                    yield f"data: {json.dumps({'error': f'Repository is too large (>{max_tokens//1000}k tokens) for analysis. {service_name} max context length exceeded. Current size: {token_count:,} tokens.'})}\n\n"
-                    return
-
-                # Notify user which service is being used
-                yield f"data: {json.dumps({'status': 'service_selected', 'message': f'Using {service_name} for this repository ({token_count:,} tokens)'})}\n\n"
-                await asyncio.sleep(0.1)
-
-                # Prepare prompts
-                first_system_prompt = SYSTEM_FIRST_PROMPT
-                third_system_prompt = SYSTEM_THIRD_PROMPT
-                if body.instructions:
-                    first_system_prompt = (
-                        first_system_prompt
-                        + "\n"
-                        + ADDITIONAL_SYSTEM_INSTRUCTIONS_PROMPT
-                    )
-                    third_system_prompt = (
-                        third_system_prompt
-                        + "\n"
-                        + ADDITIONAL_SYSTEM_INSTRUCTIONS_PROMPT
-                    )
-
-                # Phase 1: Get explanation
-                yield f"data: {json.dumps({'status': 'explanation_sent', 'message': f'Sending explanation request to {service_name}...'})}\n\n"
-                await asyncio.sleep(0.1)
-                yield f"data: {json.dumps({'status': 'explanation', 'message': 'Analyzing repository structure...'})}\n\n"
-                explanation = ""
-                
-                if use_deepseek:
-                    async for chunk in service.call_deepseek_api_stream(
-                        system_prompt=first_system_prompt,
-                        data={
-                            "file_tree": file_tree,
-                            "readme": readme,
-                            "instructions": body.instructions,
-                        },
-                        api_key=body.api_key,
-                    ):
-                        explanation += chunk
-                        yield f"data: {json.dumps({'status': 'explanation_chunk', 'chunk': chunk})}\n\n"
-                else:
-                    async for chunk in service.call_o4_api_stream(
-                        system_prompt=first_system_prompt,
-                        data={
-                            "file_tree": file_tree,
-                            "readme": readme,
-                            "instructions": body.instructions,
-                        },
-                        api_key=body.api_key,
-                        reasoning_effort="medium",
-                    ):
-                        explanation += chunk
-                        yield f"data: {json.dumps({'status': 'explanation_chunk', 'chunk': chunk})}\n\n"
-
-                if "BAD_INSTRUCTIONS" in explanation:
-                    yield f"data: {json.dumps({'error': 'Invalid or unclear instructions provided'})}\n\n"
-                    return
-
-                # Phase 2: Get component mapping
-                yield f"data: {json.dumps({'status': 'mapping_sent', 'message': f'Sending component mapping request to {service_name}...'})}\n\n"
-                await asyncio.sleep(0.1)
-                yield f"data: {json.dumps({'status': 'mapping', 'message': 'Creating component mapping...'})}\n\n"
-                full_second_response = ""
-                
-                if use_deepseek:
-                    async for chunk in service.call_deepseek_api_stream(
-                        system_prompt=SYSTEM_SECOND_PROMPT,
-                        data={"explanation": explanation, "file_tree": file_tree},
-                        api_key=body.api_key,
-                    ):
-                        full_second_response += chunk
-                        yield f"data: {json.dumps({'status': 'mapping_chunk', 'chunk': chunk})}\n\n"
-                else:
-                    async for chunk in service.call_o4_api_stream(
-                        system_prompt=SYSTEM_SECOND_PROMPT,
-                        data={"explanation": explanation, "file_tree": file_tree},
-                        api_key=body.api_key,
-                        reasoning_effort="low",
-                    ):
-                        full_second_response += chunk
-                        yield f"data: {json.dumps({'status': 'mapping_chunk', 'chunk': chunk})}\n\n"
-
-                # i dont think i need this anymore? but keep it here for now
-                # Extract component mapping
-                start_tag = "<component_mapping>"
-                end_tag = "</component_mapping>"
-                component_mapping_text = full_second_response[
-                    full_second_response.find(start_tag) : full_second_response.find(
-                        end_tag
-                    )
-                ]
-
-                # Phase 3: Generate Mermaid diagram
-                yield f"data: {json.dumps({'status': 'diagram_sent', 'message': f'Sending diagram generation request to {service_name}...'})}\n\n"
-                await asyncio.sleep(0.1)
-                yield f"data: {json.dumps({'status': 'diagram', 'message': 'Generating diagram...'})}\n\n"
-                mermaid_code = ""
-                
-                if use_deepseek:
-                    async for chunk in service.call_deepseek_api_stream(
-                        system_prompt=third_system_prompt,
-                        data={
-                            "explanation": explanation,
-                            "component_mapping": component_mapping_text,
-                            "instructions": body.instructions,
-                        },
-                        api_key=body.api_key,
-                    ):
-                        mermaid_code += chunk
-                        yield f"data: {json.dumps({'status': 'diagram_chunk', 'chunk': chunk})}\n\n"
-                else:
-                    async for chunk in service.call_o4_api_stream(
-                        system_prompt=third_system_prompt,
-                        data={
-                            "explanation": explanation,
-                            "component_mapping": component_mapping_text,
-                            "instructions": body.instructions,
-                        },
-                        api_key=body.api_key,
-                        reasoning_effort="low",
-                    ):
-                        mermaid_code += chunk
-                        yield f"data: {json.dumps({'status': 'diagram_chunk', 'chunk': chunk})}\n\n"
-
-                # Process final diagram
-                mermaid_code = mermaid_code.replace("```mermaid", "").replace("```", "")
-                if "BAD_INSTRUCTIONS" in mermaid_code:
-                    yield f"data: {json.dumps({'error': 'Invalid or unclear instructions provided'})}\n\n"
-                    return
-
-                processed_diagram = process_click_events(
-                    mermaid_code, body.username, body.repo, default_branch
-                )
-
-                # Send final result
-                yield f"data: {json.dumps({
-                    'status': 'complete',
-                    'diagram': processed_diagram,
-                    'explanation': explanation,
-                    'mapping': component_mapping_text
-                })}\n\n"
-
             except Exception as e:
                 yield f"data: {json.dumps({'error': str(e)})}\n\n"
+                return
+
+            # Identical concurrent generations share one pipeline run and
+            # receive the same events
+            flight_key = (
+                body.username.lower(),
+                body.repo.lower(),
+                github_data["commit_sha"],
+                hashlib.sha256(body.instructions.encode()).hexdigest(),
+                hashlib.sha256(body.api_key.encode()).hexdigest()
+                if body.api_key
+                else None,
+                body.bypass_cache,
+            )
+            async with aclosing(
+                generation_flights.subscribe(
+                    flight_key, lambda: generation_events(body, github_data)
+                )
+            ) as events:
+                async for event in events:
+                    yield event
 
         return StreamingResponse(
             event_generator(),
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Request
+from app.core.http_pool import user_client_pool
+from app.services.github_rate_limit import github_rate_limiter
+from app.services.llm_router import llm_router
+from app.services.llm_stream import prompt_cache_stats
+from app.services.diagram_cache import diagram_result_cache, phase_output_cache
+from app.services.repo_data import (
+    github_data_cache,
+    github_failure_cache,
+    prompt_tree_cache,
+)
+
+router = APIRouter(prefix="/metrics", tags=["Metrics"])
+
+
+@router.get("")
+async def get_metrics(request: Request):
+    """
+    Per-worker cache statistics, used to size container memory limits, the
+    GitHub rate limit budget left per kind of credential, the rolling LLM
+    provider statistics phases are routed by and the prompt tokens each
+    provider served from its prefix cache.
+    """
+    return {
+        "github_data_cache": github_data_cache.stats(),
+        "github_failure_cache": github_failure_cache.stats(),
+        "prompt_tree_cache": prompt_tree_cache.stats(),
+        "diagram_result_cache": diagram_result_cache.stats(),
+        "phase_output_cache": phase_output_cache.stats(),
+        "github_rate_limits": github_rate_limiter.stats(),
+        "user_client_pool": user_client_pool.stats(),
+        "llm_providers": llm_router.stats(),
+        "llm_prompt_cache": prompt_cache_stats.stats(),
+    }
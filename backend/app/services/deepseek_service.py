@@ -1,10 +1,13 @@
 from openai import OpenAI
 from dotenv import load_dotenv
-from app.utils.format_message import format_user_message
-import tiktoken
+from app.core.http_pool import user_client_pool
+from app.services.llm_stream import stream_chat_completion
+from app.utils.format_message import (
+    format_prompt_messages,
+    format_user_message,
+)
+from app.utils.token_counter import count_tokens
 import os
-import aiohttp
-import json
 from typing import AsyncGenerator, Literal
 
 load_dotenv()
@@ -16,8 +19,6 @@ class DeepSeekService:
             api_key=os.getenv("DEEPSEEK_API_KEY"),
             base_url="https://api.deepseek.com/v1"
         )
-        # Use the same encoding as OpenAI for token counting compatibility
-        self.encoding = tiktoken.get_encoding("o200k_base")
         self.base_url = "https://api.deepseek.com/v1/chat/completions"
 
     def call_deepseek_api(
@@ -43,10 +44,11 @@ class DeepSeekService:
         user_message = format_user_message(data)
 
         # Use custom client if API key provided, otherwise use default
-        client = OpenAI(
-            api_key=api_key or os.getenv("DEEPSEEK_API_KEY"),
-            base_url="https://api.deepseek.com/v1"
-        ) if api_key else self.default_client
+        client = (
+            user_client_pool.get(api_key, base_url="https://api.deepseek.com/v1")
+            if api_key
+            else self.default_client
+        )
 
         try:
             print(
@@ -88,8 +90,12 @@ class DeepSeekService:
         Yields:
             str: Chunks of DeepSeek's response
         """
-        # Create the user message with the data
-        user_message = format_user_message(data)
+        # Shared context first so DeepSeek can reuse its cached prefix. Its
+        # chat template moves system messages to the front, so the phase
+        # prompt goes in a user message after the context
+        messages = format_prompt_messages(
+            system_prompt, data, system_role=False
+        )
 
         headers = {
             "Authorization": f"Bearer {api_key or os.getenv('DEEPSEEK_API_KEY')}",
@@ -98,49 +104,19 @@ class DeepSeekService:
 
         payload = {
             "model": model,
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ],
+            "messages": messages,
             "max_tokens": 8000,
             "temperature": 0,
             "stream": True,
+            # Final chunk reports usage, including cached prompt tokens
+            "stream_options": {"include_usage": True},
         }
 
-        try:
-            print(f"Making streaming API call to DeepSeek")
-            
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url, headers=headers, json=payload
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        raise Exception(f"DeepSeek API error: {response.status} - {error_text}")
-
-                    async for line in response.content:
-                        line = line.decode("utf-8").strip()
-                        if line.startswith("data: "):
-                            data_content = line[6:]
-                            if data_content == "[DONE]":
-                                break
-                            try:
-                                chunk_data = json.loads(data_content)
-                                if (
-                                    "choices" in chunk_data
-                                    and len(chunk_data["choices"]) > 0
-                                    and "delta" in chunk_data["choices"][0]
-                                    and "content" in chunk_data["choices"][0]["delta"]
-                                ):
-                                    content = chunk_data["choices"][0]["delta"]["content"]
-                                    if content:
-                                        yield content
-                            except json.JSONDecodeError:
-                                continue
-
-        except Exception as e:
-            print(f"Error in call_deepseek_api_stream: {str(e)}")
-            raise e
+        print("Making streaming API call to DeepSeek")
+        async for content in stream_chat_completion(
+            "deepseek", "DeepSeek", self.base_url, headers, payload
+        ):
+            yield content
 
     def count_tokens(self, text: str) -> int:
         """
@@ -152,4 +128,4 @@ class DeepSeekService:
         Returns:
             int: Number of tokens
         """
-        return len(self.encoding.encode(text))
+        return count_tokens(text)
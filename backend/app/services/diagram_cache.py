@@ -0,0 +1,88 @@
+from app.core.memory_cache import ByteBudgetCache
+from dotenv import load_dotenv
+from typing import AsyncGenerator, AsyncIterator, Callable
+import hashlib
+import json
+import os
+
+load_dotenv()
+
+# Memory budget per worker for finished diagrams (compressed size), 0 disables caching
+DIAGRAM_CACHE_MAX_BYTES = int(
+    os.getenv("DIAGRAM_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+DIAGRAM_CACHE_TTL_SECONDS = float(
+    os.getenv("DIAGRAM_CACHE_TTL_SECONDS", str(24 * 60 * 60))
+)
+
+# Final pipeline results: diagram, explanation and mapping
+diagram_result_cache = ByteBudgetCache(
+    max_bytes=DIAGRAM_CACHE_MAX_BYTES, ttl=DIAGRAM_CACHE_TTL_SECONDS
+)
+# Output of each individual LLM phase, keyed by the exact inputs of that phase
+phase_output_cache = ByteBudgetCache(
+    max_bytes=DIAGRAM_CACHE_MAX_BYTES, ttl=DIAGRAM_CACHE_TTL_SECONDS
+)
+
+
+def hash_text(text: str) -> str:
+    """Returns a short stable digest of text for use in cache keys."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def diagram_result_key(
+    username: str, repo: str, commit_sha: str, instructions: str, model: str
+) -> tuple[str, ...]:
+    """
+    Key of a finished diagram. The commit SHA pins the repository content, so
+    entries never go stale for the code they describe.
+    """
+    return (
+        username.lower(),
+        repo.lower(),
+        commit_sha,
+        hash_text(instructions),
+        model,
+    )
+
+
+def phase_output_key(
+    model: str, system_prompt: str, data: dict, reasoning_effort: str | None = None
+) -> str:
+    """
+    Key of one phase output. It covers everything sent to the model, so an
+    identical request reuses the output even across commits, e.g. when a new
+    commit changes file contents but not the file tree or README.
+    """
+    return hash_text(json.dumps([model, reasoning_effort, system_prompt, data]))
+
+
+async def cached_phase_stream(
+    key: str,
+    stream: AsyncIterator[str],
+    bypass_cache: bool = False,
+    store_key: Callable[[], str] | None = None,
+) -> AsyncGenerator[str, None]:
+    """
+    Yields a phase output from the phase cache as a single chunk, or relays
+    stream and caches its output once it completes. The stream is never
+    started on a cache hit.
+
+    Args:
+        key (str): Key from phase_output_key
+        stream (AsyncIterator[str]): Provider stream producing the phase output
+        bypass_cache (bool): Skip the lookup and always run the stream
+        store_key (Callable[[], str] | None): Returns the key to store the
+            output under once the stream completes, for streams that may be
+            answered by another model than the one key is for. Defaults to key
+    """
+    cached = None if bypass_cache else phase_output_cache.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    output = ""
+    async for chunk in stream:
+        output += chunk
+        yield chunk
+    phase_output_cache.set(store_key() if store_key else key, output)
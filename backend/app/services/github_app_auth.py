@@ -0,0 +1,187 @@
+import aiohttp
+import asyncio
+import json
+import jwt
+import os
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+from typing import AsyncIterator
+
+try:
+    import fcntl
+except ImportError:  # Windows, tokens are then only shared within a process
+    fcntl = None
+
+load_dotenv()
+
+# Where installation tokens are shared between worker processes
+GITHUB_TOKEN_CACHE_DIR = os.getenv("GITHUB_TOKEN_CACHE_DIR", ".cache")
+# Tokens are refreshed in the background once they are this close to expiry
+TOKEN_REFRESH_MARGIN_SECONDS = float(os.getenv("GITHUB_TOKEN_REFRESH_MARGIN", "300"))
+# Below this remaining lifetime a request waits for a new token instead
+TOKEN_MIN_VALIDITY_SECONDS = 60
+
+
+class InstallationTokenManager:
+    """
+    Hands out GitHub App installation tokens, shared by every request in the
+    process and, through a token file, by every worker on the machine.
+
+    The hot path is a timestamp comparison: a JWT is only signed and an
+    access token only requested when the current token nears expiry. Tokens
+    are refreshed proactively in the background during the last
+    TOKEN_REFRESH_MARGIN_SECONDS of their lifetime, and refreshes are
+    serialized by a lock within the process and a file lock across workers,
+    so each installation costs one token request per hour per machine.
+    """
+
+    def __init__(
+        self,
+        client_id: str,
+        private_key: str,
+        installation_id: str,
+        api_url: str,
+        cache_dir: str = GITHUB_TOKEN_CACHE_DIR,
+    ):
+        self.client_id = client_id
+        self.private_key = private_key
+        self.installation_id = installation_id
+        self.access_tokens_url = (
+            f"{api_url}/app/installations/{installation_id}/access_tokens"
+        )
+        self._path = os.path.join(cache_dir, f"github_installation_{installation_id}.json")
+
+        self._token: str | None = None
+        self._expires_at = 0.0
+        self._lock = asyncio.Lock()
+        self._refresh_task: asyncio.Task | None = None
+
+    def _remaining(self) -> float:
+        return self._expires_at - time.time() if self._token else 0.0
+
+    async def get_token(self, session: aiohttp.ClientSession) -> str:
+        """
+        Returns a valid installation token.
+
+        Args:
+            session (aiohttp.ClientSession): Session used if a new token has to be requested
+        """
+        remaining = self._remaining()
+        if remaining > TOKEN_REFRESH_MARGIN_SECONDS:
+            return self._token  # type: ignore
+
+        if remaining > TOKEN_MIN_VALIDITY_SECONDS:
+            # Still good for a while, keep serving it while a new one is fetched
+            if self._refresh_task is None or self._refresh_task.done():
+                self._refresh_task = asyncio.create_task(
+                    self._refresh_in_background(session)
+                )
+            return self._token  # type: ignore
+
+        return await self._refresh(session)
+
+    async def _refresh_in_background(self, session: aiohttp.ClientSession):
+        try:
+            await self._refresh(session)
+        except Exception as e:
+            print(f"Error refreshing GitHub installation token: {str(e)}")
+
+    async def _refresh(self, session: aiohttp.ClientSession) -> str:
+        async with self._lock:
+            # Another request may have refreshed while this one waited
+            if self._remaining() > TOKEN_REFRESH_MARGIN_SECONDS:
+                return self._token  # type: ignore
+
+            async with self._file_lock():
+                # ... or another worker
+                token, expires_at = await asyncio.to_thread(self._read_shared)
+                if token is None or expires_at - time.time() <= TOKEN_REFRESH_MARGIN_SECONDS:
+                    token, expires_at = await self._request_token(session)
+                    await asyncio.to_thread(self._write_shared, token, expires_at)
+
+            self._token, self._expires_at = token, expires_at
+            return token
+
+    # autopep8: off
+    def _generate_jwt(self):
+        now = int(time.time())
+        payload = {
+            "iat": now - 60,  # allow for clock drift
+            "exp": now + (10 * 60),  # 10 minutes
+            "iss": self.client_id,
+        }
+        # Convert PEM string format to proper newlines
+        return jwt.encode(payload, self.private_key, algorithm="RS256")  # type: ignore
+
+    # autopep8: on
+
+    async def _request_token(self, session: aiohttp.ClientSession) -> tuple[str, float]:
+        async with session.post(
+            self.access_tokens_url,
+            headers={
+                "Authorization": f"Bearer {self._generate_jwt()}",
+                "Accept": "application/vnd.github+json",
+            },
+        ) as response:
+            if response.status != 201:
+                raise Exception(
+                    f"Failed to get installation token: {response.status}, {await response.text()}"
+                )
+            data = await response.json()
+
+        try:
+            expires_at = datetime.fromisoformat(
+                data["expires_at"].replace("Z", "+00:00")
+            ).timestamp()
+        except (KeyError, ValueError):
+            expires_at = time.time() + 60 * 60  # documented lifetime
+        return data["token"], expires_at
+
+    @asynccontextmanager
+    async def _file_lock(self) -> AsyncIterator[None]:
+        """Holds an exclusive lock next to the token file while it is refreshed."""
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(self._path) or ".", exist_ok=True)
+        with open(f"{self._path}.lock", "w") as lock_file:
+            # Another worker may hold it for a whole token request
+            await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read_shared(self) -> tuple[str | None, float]:
+        try:
+            with open(self._path) as f:
+                data = json.load(f)
+            return data["token"], float(data["expires_at"])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None, 0.0
+
+    def _write_shared(self, token: str, expires_at: float):
+        # Written to a private temporary file and swapped in atomically
+        temp_path = f"{self._path}.{os.getpid()}.tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"token": token, "expires_at": expires_at}, f)
+        os.replace(temp_path, self._path)
+
+
+_managers: dict[tuple[str, str], InstallationTokenManager] = {}
+
+
+def get_installation_token_manager(
+    client_id: str, private_key: str, installation_id: str, api_url: str
+) -> InstallationTokenManager:
+    """Returns the process-wide token manager for an app installation."""
+    key = (client_id, installation_id)
+    manager = _managers.get(key)
+    if manager is None:
+        manager = _managers[key] = InstallationTokenManager(
+            client_id, private_key, installation_id, api_url
+        )
+    return manager
@@ -0,0 +1,196 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from dotenv import load_dotenv
+from typing import Mapping
+import os
+
+load_dotenv()
+
+# Share of each credential's hourly budget kept for interactive requests
+GITHUB_RATE_LIMIT_RESERVE = float(os.getenv("GITHUB_RATE_LIMIT_RESERVE", "0.1"))
+# Longest a request waits for budget before failing instead
+GITHUB_MAX_RATE_LIMIT_WAIT = float(os.getenv("GITHUB_MAX_RATE_LIMIT_WAIT", "10"))
+# Retries after a 403/429 rate limit response
+GITHUB_RATE_LIMIT_RETRIES = 2
+# GitHub asks for at least a minute of back off when it gives no other hint
+SECONDARY_LIMIT_BACKOFF_SECONDS = 60
+# Credentials tracked at once, user PATs would otherwise accumulate forever
+MAX_TRACKED_CREDENTIALS = 1024
+
+# Requests a user is waiting on, e.g. HEAD, the recursive tree and the README
+PRIORITY_INTERACTIVE = 0
+# Requests that only refine a result, e.g. subtrees of a truncated tree
+PRIORITY_BACKGROUND = 1
+
+
+class RateLimitExceeded(ValueError):
+    """Raised when a request would have to wait too long for rate limit budget."""
+
+    def __init__(self, wait: float):
+        super().__init__(
+            f"GitHub API rate limit exceeded. Please try again in {max(1, math.ceil(wait / 60))} minute(s) or provide a GitHub personal access token."
+        )
+        self.wait = wait
+
+
+@dataclass
+class _Budget:
+    """What is known about one credential's rate limit, from response headers."""
+
+    limit: int | None = None
+    remaining: int | None = None
+    reset_at: float = 0.0
+    blocked_until: float = 0.0
+    in_flight: int = 0
+    requests: int = 0
+    waits: int = 0
+    throttled: int = 0
+
+
+class GitHubRateLimiter:
+    """
+    Schedules GitHub requests against the rate limit of the credential they
+    use, as reported by the X-RateLimit-* headers of earlier responses.
+
+    Requests in flight are counted against the remaining budget so a burst
+    cannot overshoot it. Background requests stop once only the reserved
+    share is left, keeping it for interactive ones. When the budget is
+    exhausted, or GitHub answered 403/429 with Retry-After, requests wait
+    for the reset if it is near and fail fast with RateLimitExceeded if not.
+
+    Per worker process; every worker sees the same headers, so their views
+    converge with each response.
+    """
+
+    def __init__(
+        self,
+        reserve: float = GITHUB_RATE_LIMIT_RESERVE,
+        max_wait: float = GITHUB_MAX_RATE_LIMIT_WAIT,
+    ):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self._budgets: OrderedDict[str, _Budget] = OrderedDict()
+
+    def _budget(self, scope: str) -> _Budget:
+        budget = self._budgets.get(scope)
+        if budget is None:
+            budget = self._budgets[scope] = _Budget()
+            if len(self._budgets) > MAX_TRACKED_CREDENTIALS:
+                self._budgets.popitem(last=False)
+        self._budgets.move_to_end(scope)
+        return budget
+
+    def _wait_time(self, budget: _Budget, priority: int) -> float:
+        now = time.time()
+        if budget.blocked_until > now:
+            return budget.blocked_until - now
+        if budget.remaining is None or budget.reset_at <= now:
+            return 0.0
+        floor = (
+            0
+            if priority == PRIORITY_INTERACTIVE
+            else self.reserve * (budget.limit or 0)
+        )
+        if budget.remaining - budget.in_flight <= floor:
+            return budget.reset_at - now
+        return 0.0
+
+    def wait_time(self, scope: str, priority: int = PRIORITY_INTERACTIVE) -> float:
+        """Returns how long a request for scope would currently have to wait."""
+        return self._wait_time(self._budget(scope), priority)
+
+    async def acquire(self, scope: str, priority: int = PRIORITY_INTERACTIVE):
+        """
+        Waits until a request may be sent with the credential scope and counts
+        it as in flight. Every acquire must be followed by a release.
+
+        Raises:
+            RateLimitExceeded: If the wait would exceed max_wait.
+        """
+        budget = self._budget(scope)
+        while (wait := self._wait_time(budget, priority)) > 0:
+            if wait > self.max_wait:
+                raise RateLimitExceeded(wait)
+            budget.waits += 1
+            await asyncio.sleep(wait)
+        budget.in_flight += 1
+        budget.requests += 1
+
+    def release(self, scope: str):
+        """Marks a request acquired for scope as finished."""
+        budget = self._budget(scope)
+        budget.in_flight = max(0, budget.in_flight - 1)
+
+    def record(self, scope: str, status: int, headers: Mapping[str, str]) -> bool:
+        """
+        Updates the budget of scope from a response.
+
+        Returns:
+            bool: True if the response was a rate limit rejection worth retrying
+            once the budget allows; the wait is then applied by acquire.
+        """
+        budget = self._budget(scope)
+        try:
+            if "X-RateLimit-Remaining" in headers:
+                budget.remaining = int(headers["X-RateLimit-Remaining"])
+                budget.limit = int(headers.get("X-RateLimit-Limit", budget.limit or 0))
+                budget.reset_at = float(headers.get("X-RateLimit-Reset", 0))
+        except ValueError:
+            pass
+
+        if status not in (403, 429):
+            return False
+
+        now = time.time()
+        retry_after = headers.get("Retry-After")
+        if retry_after and retry_after.isdigit():
+            budget.blocked_until = now + int(retry_after)
+        elif budget.remaining == 0 and budget.reset_at > now:
+            budget.blocked_until = budget.reset_at
+        elif status == 429:
+            budget.blocked_until = now + SECONDARY_LIMIT_BACKOFF_SECONDS
+        else:
+            # A plain 403 is a permission error, not a rate limit
+            return False
+        budget.throttled += 1
+        return True
+
+    def stats(self) -> dict:
+        """
+        Returns the tracked budgets aggregated by credential kind ("pat",
+        "installation" or "anonymous"). Scopes identify user tokens and the
+        app installation, so they are never listed individually.
+        """
+        now = time.time()
+        kinds: dict[str, dict] = {}
+        for scope, budget in self._budgets.items():
+            kind = kinds.setdefault(
+                scope.partition(":")[0],
+                {
+                    "credentials": 0,
+                    "lowest_remaining": None,
+                    "blocked": 0,
+                    "in_flight": 0,
+                    "requests": 0,
+                    "waits": 0,
+                    "throttled": 0,
+                },
+            )
+            kind["credentials"] += 1
+            lowest = kind["lowest_remaining"]
+            if budget.remaining is not None and budget.reset_at > now:
+                kind["lowest_remaining"] = (
+                    budget.remaining if lowest is None else min(lowest, budget.remaining)
+                )
+            kind["blocked"] += budget.blocked_until > now
+            kind["in_flight"] += budget.in_flight
+            kind["requests"] += budget.requests
+            kind["waits"] += budget.waits
+            kind["throttled"] += budget.throttled
+        return kinds
+
+
+github_rate_limiter = GitHubRateLimiter()
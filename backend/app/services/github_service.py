@@ -1,15 +1,78 @@
-import requests
-import jwt
-import time
-from datetime import datetime, timedelta
+import aiohttp
+import asyncio
+import hashlib
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
 from dotenv import load_dotenv
+from app.services.github_app_auth import get_installation_token_manager
+from app.services.github_rate_limit import (
+    GITHUB_RATE_LIMIT_RETRIES,
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    RateLimitExceeded,
+    github_rate_limiter,
+)
+from app.utils.path_filter import PathFilter, default_path_filter
+from app.utils.tree_parser import TreePathParser
+import io
 import os
 
 load_dotenv()
 
+GITHUB_API_URL = "https://api.github.com"
+# Read size for streamed response bodies
+TREE_CHUNK_SIZE = 64 * 1024
+# Bounds for rebuilding trees that GitHub truncates, see _walk_truncated_tree
+TREE_WALK_CONCURRENCY = int(os.getenv("TREE_WALK_CONCURRENCY", "8"))
+TREE_WALK_MAX_DEPTH = int(os.getenv("TREE_WALK_MAX_DEPTH", "3"))
+TREE_WALK_MAX_ENTRIES = int(os.getenv("TREE_WALK_MAX_ENTRIES", "300000"))
+
+# One pooled session per worker process. Created lazily because an
+# aiohttp.ClientSession must be bound to the running event loop.
+_session: aiohttp.ClientSession | None = None
+
+
+def get_github_session() -> aiohttp.ClientSession:
+    """Returns the long-lived pooled session used for all GitHub requests."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+            timeout=aiohttp.ClientTimeout(total=60, sock_connect=10),
+        )
+    return _session
+
+
+async def close_github_session():
+    """Closes the pooled GitHub session. Called on application shutdown."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+
+
+class RepositoryLookupError(ValueError):
+    """
+    Raised when GitHub answers that a repository, its README or its tree does
+    not exist or cannot be read with the credential used. Unlike server
+    errors these are worth remembering for a while, see github_failure_cache.
+    """
+
+
+@dataclass
+class RepoSnapshot:
+    """The repository data the diagram pipeline needs, fetched in one pass."""
+
+    default_branch: str
+    file_tree: str
+    readme: str
+    private: bool
+
 
 class GitHubService:
-    def __init__(self, pat: str | None = None):
+    def __init__(
+        self, pat: str | None = None, path_filter: PathFilter | None = None
+    ):
         # Try app authentication first
         self.client_id = os.getenv("GITHUB_CLIENT_ID")
         self.private_key = os.getenv("GITHUB_PRIVATE_KEY")
@@ -27,41 +90,31 @@ class GitHubService:
                 "\033[93mWarning: No GitHub credentials provided. Using unauthenticated requests with rate limit of 60 requests/hour.\033[0m"
             )
 
-        self.access_token = None
-        self.token_expires_at = None
-
-    # autopep8: off
-    def _generate_jwt(self):
-        now = int(time.time())
-        payload = {
-            "iat": now,
-            "exp": now + (10 * 60),  # 10 minutes
-            "iss": self.client_id,
-        }
-        # Convert PEM string format to proper newlines
-        return jwt.encode(payload, self.private_key, algorithm="RS256")  # type: ignore
-
-    # autopep8: on
+        # Excludes static files and generated code from file trees
+        self.path_filter = path_filter or default_path_filter
 
-    def _get_installation_token(self):
-        if self.access_token and self.token_expires_at > datetime.now():  # type: ignore
-            return self.access_token
-
-        jwt_token = self._generate_jwt()
-        response = requests.post(
-            f"https://api.github.com/app/installations/{
-                self.installation_id}/access_tokens",
-            headers={
-                "Authorization": f"Bearer {jwt_token}",
-                "Accept": "application/vnd.github+json",
-            },
+    def credential_scope(self) -> str:
+        """
+        Returns a stable identifier of the credential this service authenticates
+        with, safe to use in cache keys: raw tokens are never part of it.
+        """
+        if self.github_token:
+            return f"pat:{hashlib.sha256(self.github_token.encode()).hexdigest()}"
+        if all([self.client_id, self.private_key, self.installation_id]):
+            return f"installation:{self.installation_id}"
+        return "anonymous"
+
+    async def _get_installation_token(self):
+        # Tokens are cached process-wide, this instance only lives for one call
+        manager = get_installation_token_manager(
+            self.client_id,  # type: ignore
+            self.private_key,  # type: ignore
+            self.installation_id,  # type: ignore
+            GITHUB_API_URL,
         )
-        data = response.json()
-        self.access_token = data["token"]
-        self.token_expires_at = datetime.now() + timedelta(hours=1)
-        return self.access_token
+        return await manager.get_token(get_github_session())
 
-    def _get_headers(self):
+    async def _get_headers(self):
         # If no credentials are available, return basic headers
         if (
             not all([self.client_id, self.private_key, self.installation_id])
@@ -77,37 +130,250 @@ class GitHubService:
             }
 
         # Otherwise use app authentication
-        token = self._get_installation_token()
+        token = await self._get_installation_token()
         return {
             "Authorization": f"Bearer {token}",
             "Accept": "application/vnd.github+json",
             "X-GitHub-Api-Version": "2022-11-28",
         }
 
-    def _check_repository_exists(self, username, repo):
+    @asynccontextmanager
+    async def _request(self, url, headers, priority=PRIORITY_INTERACTIVE):
+        """
+        Sends a GET request scheduled against this credential's rate limit,
+        retrying rate limit rejections once the budget allows.
+
+        Raises:
+            RateLimitExceeded: If the budget does not allow the request soon.
+        """
+        scope = self.credential_scope()
+        for _ in range(GITHUB_RATE_LIMIT_RETRIES + 1):
+            await github_rate_limiter.acquire(scope, priority)
+            try:
+                async with get_github_session().get(url, headers=headers) as response:
+                    if not github_rate_limiter.record(
+                        scope, response.status, response.headers
+                    ):
+                        yield response
+                        return
+            finally:
+                github_rate_limiter.release(scope)
+        raise RateLimitExceeded(github_rate_limiter.wait_time(scope))
+
+    async def _get_repository(self, username, repo):
         """
-        Check if the repository exists using the GitHub API.
+        Fetches the repository metadata, raising if the repository does not exist.
         """
-        api_url = f"https://api.github.com/repos/{username}/{repo}"
-        response = requests.get(api_url, headers=self._get_headers())
+        api_url = f"{GITHUB_API_URL}/repos/{username}/{repo}"
+        async with self._request(api_url, await self._get_headers()) as response:
+            if response.status == 404:
+                raise RepositoryLookupError("Repository not found.")
+            elif response.status != 200:
+                raise Exception(
+                    f"Failed to check repository: {response.status}, {await response.text()}"
+                )
+            return await response.json()
+
+    async def get_head_commit(self, username, repo, etag=None):
+        """
+        Resolves the commit SHA the default branch points to.
 
-        if response.status_code == 404:
-            raise ValueError("Repository not found.")
-        elif response.status_code != 200:
-            raise Exception(
-                f"Failed to check repository: {response.status_code}, {response.json()}"
-            )
+        Args:
+            username (str): The GitHub username or organization name
+            repo (str): The repository name
+            etag (str | None): ETag of a previous response for a conditional request
 
-    def get_default_branch(self, username, repo):
+        Returns:
+            tuple[str | None, str | None]: The commit SHA and the response ETag.
+            The SHA is None when GitHub answers 304 Not Modified, i.e. HEAD has
+            not moved since the response the ETag belongs to. Conditional
+            requests answered with a 304 do not count against the rate limit.
+
+        Raises:
+            RepositoryLookupError: If the repository does not exist or is empty.
+            Exception: For other unexpected API errors.
+        """
+        api_url = f"{GITHUB_API_URL}/repos/{username}/{repo}/commits/HEAD"
+        headers = {
+            **await self._get_headers(),
+            "Accept": "application/vnd.github.sha",
+        }
+        if etag:
+            headers["If-None-Match"] = etag
+
+        async with self._request(api_url, headers) as response:
+            if response.status == 304:
+                return None, etag
+            elif response.status == 404:
+                raise RepositoryLookupError("Repository not found.")
+            elif response.status in (409, 422):
+                raise RepositoryLookupError(
+                    "Could not fetch repository file tree. Repository might not exist, be empty or private."
+                )
+            elif response.status != 200:
+                raise Exception(
+                    f"Failed to resolve repository HEAD: {response.status}, {await response.text()}"
+                )
+            return (await response.text()).strip(), response.headers.get("ETag")
+
+    async def get_default_branch(self, username, repo):
         """Get the default branch of the repository."""
-        api_url = f"https://api.github.com/repos/{username}/{repo}"
-        response = requests.get(api_url, headers=self._get_headers())
+        try:
+            return (await self._get_repository(username, repo)).get("default_branch")
+        except Exception:
+            return None
+
+    async def _fetch_tree(
+        self,
+        username,
+        repo,
+        tree_ref,
+        prefix="",
+        dir_cache=None,
+        priority=PRIORITY_INTERACTIVE,
+    ):
+        """
+        Fetches a recursive tree listing, streaming its paths through the path filter.
+
+        Args:
+            username (str): The GitHub username or organization name
+            repo (str): The repository name
+            tree_ref (str): Commit-ish or tree SHA to list
+            prefix (str): Prepended to every path, for subtrees
+            dir_cache (dict[str, bool] | None): Path filter directory memo to share
+            priority (int): Rate limit priority of the request
+
+        Returns:
+            tuple[str, bool]: The filtered paths, one per line, and whether
+            GitHub truncated the listing.
+        """
+        api_url = f"{GITHUB_API_URL}/repos/{username}/{repo}/git/trees/{tree_ref}?recursive=1"
+        async with self._request(
+            api_url, await self._get_headers(), priority=priority
+        ) as response:
+            if response.status in (404, 409, 422):
+                raise RepositoryLookupError(
+                    "Could not fetch repository file tree. Repository might not exist, be empty or private."
+                )
+            elif response.status != 200:
+                raise Exception(
+                    f"Failed to fetch repository file tree: {response.status}, {await response.text()}"
+                )
+
+            # Stream paths from the body through the filter as they arrive,
+            # never holding the whole JSON document or a list of every entry
+            parser = TreePathParser()
+            dir_cache = {} if dir_cache is None else dir_cache
+            file_tree = io.StringIO()
+            async for chunk in response.content.iter_chunked(TREE_CHUNK_SIZE):
+                paths = parser.feed(chunk)
+                if prefix:
+                    paths = [prefix + path for path in paths]
+                for path in self.path_filter.filter(paths, dir_cache):
+                    if file_tree.tell():
+                        file_tree.write("\n")
+                    file_tree.write(path)
+            parser.close()
+
+        return file_tree.getvalue(), parser.truncated
+
+    async def _list_tree(self, username, repo, tree_ref, priority=PRIORITY_INTERACTIVE):
+        """Lists the direct entries of a tree, without recursing."""
+        api_url = f"{GITHUB_API_URL}/repos/{username}/{repo}/git/trees/{tree_ref}"
+        async with self._request(
+            api_url, await self._get_headers(), priority=priority
+        ) as response:
+            if response.status in (404, 409, 422):
+                raise RepositoryLookupError(
+                    "Could not fetch repository file tree. Repository might not exist, be empty or private."
+                )
+            elif response.status != 200:
+                raise Exception(
+                    f"Failed to fetch repository file tree: {response.status}, {await response.text()}"
+                )
+            return (await response.json())["tree"]
+
+    async def _walk_truncated_tree(self, username, repo, ref):
+        """
+        Rebuilds a file tree whose recursive listing GitHub truncated (over
+        100,000 entries or 7 MB) from recursive listings of its subtrees.
+
+        Subtrees that are truncated themselves are split further, down to
+        TREE_WALK_MAX_DEPTH levels. At most TREE_WALK_CONCURRENCY requests
+        run at once, and no new subtree is fetched once TREE_WALK_MAX_ENTRIES
+        paths were collected, so latency and rate limit spend stay bounded.
+        Subtree requests run at background priority and are skipped once only
+        the rate limit reserve for interactive requests is left.
+        Directories excluded by the path filter are never fetched.
+
+        Returns:
+            str: The filtered paths, one per line, in the same order as an
+            untruncated recursive listing.
+        """
+        semaphore = asyncio.Semaphore(TREE_WALK_CONCURRENCY)
+        dir_cache: dict[str, bool] = {}
+        collected = 0
+
+        async def expand(tree_sha, prefix, depth):
+            nonlocal collected
+            if collected >= TREE_WALK_MAX_ENTRIES:
+                return ""
+            try:
+                async with semaphore:
+                    file_tree, truncated = await self._fetch_tree(
+                        username,
+                        repo,
+                        tree_sha,
+                        prefix=prefix,
+                        dir_cache=dir_cache,
+                        priority=PRIORITY_BACKGROUND,
+                    )
+                if truncated and depth < TREE_WALK_MAX_DEPTH:
+                    return await walk(tree_sha, prefix, depth + 1)
+            except Exception as e:
+                print(f"Skipping subtree {prefix} of {username}/{repo}: {str(e)}")
+                return ""
+            if file_tree:
+                collected += file_tree.count("\n") + 1
+            return file_tree
+
+        async def walk(tree_ref, prefix, depth):
+            nonlocal collected
+            async with semaphore:
+                entries = await self._list_tree(
+                    username,
+                    repo,
+                    tree_ref,
+                    # Only the top level is needed for any result at all
+                    priority=PRIORITY_INTERACTIVE if depth == 0 else PRIORITY_BACKGROUND,
+                )
+
+            paths = []
+            subtrees = []
+            for entry in entries:
+                path = prefix + entry["path"]
+                if not self.path_filter.includes(path):
+                    continue
+                if entry["type"] == "tree":
+                    path += "/"
+                    subtrees.append((len(paths), entry["sha"], path))
+                paths.append(path)
+            collected += len(paths)
+
+            contents = await asyncio.gather(
+                *(expand(sha, subtree_prefix, depth) for _, sha, subtree_prefix in subtrees)
+            )
+            # Each directory's contents directly follow its own entry
+            for (index, _, _), content in sorted(
+                zip(subtrees, contents), key=lambda item: item[0][0], reverse=True
+            ):
+                if content:
+                    paths.insert(index + 1, content)
+            return "\n".join(paths)
 
-        if response.status_code == 200:
-            return response.json().get("default_branch")
-        return None
+        return await walk(ref, "", 0)
 
-    def get_github_file_paths_as_list(self, username, repo):
+    async def get_github_file_paths_as_list(self, username, repo, ref="HEAD"):
         """
         Fetches the file tree of an open-source GitHub repository,
         excluding static files and generated code.
@@ -115,120 +381,85 @@ class GitHubService:
         Args:
             username (str): The GitHub username or organization name
             repo (str): The repository name
+            ref (str): Branch, tag or commit to read. HEAD resolves to the default branch.
 
         Returns:
-            str: A filtered and formatted string of file paths in the repository, one per line.
-        """
-
-        def should_include_file(path):
-            # Patterns to exclude
-            excluded_patterns = [
-                # Dependencies
-                "node_modules/",
-                "vendor/",
-                "venv/",
-                # Compiled files
-                ".min.",
-                ".pyc",
-                ".pyo",
-                ".pyd",
-                ".so",
-                ".dll",
-                ".class",
-                # Asset files
-                ".jpg",
-                ".jpeg",
-                ".png",
-                ".gif",
-                ".ico",
-                ".svg",
-                ".ttf",
-                ".woff",
-                ".webp",
-                # Cache and temporary files
-                "__pycache__/",
-                ".cache/",
-                ".tmp/",
-                # Lock files and logs
-                "yarn.lock",
-                "poetry.lock",
-                "*.log",
-                # Configuration files
-                ".vscode/",
-                ".idea/",
-            ]
-
-            return not any(pattern in path.lower() for pattern in excluded_patterns)
-
-        # Try to get the default branch first
-        branch = self.get_default_branch(username, repo)
-        if branch:
-            api_url = f"https://api.github.com/repos/{
-                username}/{repo}/git/trees/{branch}?recursive=1"
-            response = requests.get(api_url, headers=self._get_headers())
-
-            if response.status_code == 200:
-                data = response.json()
-                if "tree" in data:
-                    # Filter the paths and join them with newlines
-                    paths = [
-                        item["path"]
-                        for item in data["tree"]
-                        if should_include_file(item["path"])
-                    ]
-                    return "\n".join(paths)
-
-        # If default branch didn't work or wasn't found, try common branch names
-        for branch in ["main", "master"]:
-            api_url = f"https://api.github.com/repos/{
-                username}/{repo}/git/trees/{branch}?recursive=1"
-            response = requests.get(api_url, headers=self._get_headers())
-
-            if response.status_code == 200:
-                data = response.json()
-                if "tree" in data:
-                    # Filter the paths and join them with newlines
-                    paths = [
-                        item["path"]
-                        for item in data["tree"]
-                        if should_include_file(item["path"])
-                    ]
-                    return "\n".join(paths)
-
-        raise ValueError(
-            "Could not fetch repository file tree. Repository might not exist, be empty or private."
-        )
+            str: A filtered and formatted string of file paths in the repository,
+            one per line. Directory entries end with "/".
+        """
+        file_tree, truncated = await self._fetch_tree(username, repo, ref)
+        if truncated:
+            print(f"Tree of {username}/{repo} is truncated, walking subtrees")
+            file_tree = await self._walk_truncated_tree(username, repo, ref)
+        return file_tree
 
-    def get_github_readme(self, username, repo):
+    async def get_github_readme(self, username, repo, ref=None):
         """
         Fetches the README contents of an open-source GitHub repository.
+        The raw media type returns the file body directly, so no second
+        request to download_url is needed.
 
         Args:
             username (str): The GitHub username or organization name
             repo (str): The repository name
+            ref (str | None): Branch, tag or commit to read. Defaults to the default branch.
 
         Returns:
             str: The contents of the README file.
 
         Raises:
-            ValueError: If repository does not exist or has no README.
+            RepositoryLookupError: If the repository has no README.
             Exception: For other unexpected API errors.
         """
-        # First check if the repository exists
-        self._check_repository_exists(username, repo)
+        api_url = f"{GITHUB_API_URL}/repos/{username}/{repo}/readme"
+        if ref:
+            api_url += f"?ref={ref}"
+        headers = {
+            **await self._get_headers(),
+            "Accept": "application/vnd.github.raw+json",
+        }
+        async with self._request(api_url, headers) as response:
+            if response.status == 404:
+                raise RepositoryLookupError("No README found for the specified repository.")
+            elif response.status != 200:
+                raise Exception(
+                    f"Failed to fetch README: {response.status}, {await response.text()}"
+                )
+            return await response.text()
+
+    async def get_repo_snapshot(self, username, repo, ref="HEAD"):
+        """
+        Fetches everything needed to diagram a repository with one metadata
+        request, one recursive tree request and one README request, all issued
+        concurrently.
 
-        # Then attempt to fetch the README
-        api_url = f"https://api.github.com/repos/{username}/{repo}/readme"
-        response = requests.get(api_url, headers=self._get_headers())
+        Args:
+            username (str): The GitHub username or organization name
+            repo (str): The repository name
+            ref (str): Branch, tag or commit to read. HEAD resolves to the default branch.
 
-        if response.status_code == 404:
-            raise ValueError("No README found for the specified repository.")
-        elif response.status_code != 200:
-            raise Exception(
-                f"Failed to fetch README: {
-                            response.status_code}, {response.json()}"
-            )
+        Returns:
+            RepoSnapshot: Default branch, filtered file tree, README and visibility.
 
-        data = response.json()
-        readme_content = requests.get(data["download_url"]).text
-        return readme_content
+        Raises:
+            RepositoryLookupError: If the repository does not exist, has no README or no readable tree.
+            Exception: For other unexpected API errors.
+        """
+        metadata, file_tree, readme = await asyncio.gather(
+            self._get_repository(username, repo),
+            self.get_github_file_paths_as_list(username, repo, ref=ref),
+            self.get_github_readme(username, repo, ref=None if ref == "HEAD" else ref),
+            return_exceptions=True,
+        )
+        # Report the most fundamental failure first: a missing repository also
+        # makes the tree and README requests fail.
+        for result in (metadata, file_tree, readme):
+            if isinstance(result, BaseException):
+                raise result
+
+        return RepoSnapshot(
+            default_branch=metadata.get("default_branch") or "main",  # type: ignore
+            file_tree=file_tree,  # type: ignore
+            readme=readme,  # type: ignore
+            private=metadata.get("private", True),  # type: ignore
+        )
@@ -0,0 +1,477 @@
+import asyncio
+import math
+import os
+import time
+from collections import deque
+from contextlib import aclosing
+from dataclasses import dataclass
+from typing import AsyncGenerator, Callable
+
+from dotenv import load_dotenv
+
+from app.services.diagram_cache import phase_output_key
+
+load_dotenv()
+
+# How providers are picked for each phase. The preferred provider is the one
+# configured for the repository's token count, the same for every phase:
+#   "static"   the preferred provider, as configured
+#   "adaptive" the preferred provider unless it is failing or slow, then
+#              the best alternative that can serve the request
+#   "fastest"  whichever eligible provider currently finishes soonest
+LLM_ROUTING_POLICY = os.getenv("LLM_ROUTING_POLICY", "adaptive").lower()
+# Rolling window of calls the statistics are computed over
+LLM_STATS_WINDOW = int(os.getenv("LLM_STATS_WINDOW", "200"))
+LLM_STATS_MAX_AGE_SECONDS = float(os.getenv("LLM_STATS_MAX_AGE_SECONDS", "900"))
+# Calls needed before a provider's statistics are trusted
+LLM_STATS_MIN_SAMPLES = 5
+# A provider is unhealthy above either of these
+LLM_SLOW_TTFT_SECONDS = float(os.getenv("LLM_SLOW_TTFT_SECONDS", "30"))
+LLM_MAX_ERROR_RATE = float(os.getenv("LLM_MAX_ERROR_RATE", "0.3"))
+# Output size the "fastest" policy compares completion times for
+EXPECTED_OUTPUT_TOKENS = 1000
+
+# Hedging: a phase still waiting for its first chunk after this percentile
+# of the provider's observed TTFT starts a backup request, and whichever
+# streams first is used. Off unless enabled
+LLM_HEDGING = os.getenv("LLM_HEDGING", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+# Never hedge sooner than this, whatever the percentile says
+LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", "5"))
+# Extra spend cap: backups per call earned, and the most saved up for a burst
+LLM_HEDGE_BUDGET = float(os.getenv("LLM_HEDGE_BUDGET", "0.05"))
+HEDGE_BUDGET_BURST = 3
+
+
+@dataclass
+class LLMProvider:
+    """
+    A model the diagram pipeline can stream phases from, and the token
+    limits that decide which requests it may serve.
+    """
+
+    name: str
+    model: str
+    # Context the model accepts
+    max_tokens: int
+    # Largest request served on our own API key
+    wallet_limit: int
+    # Preferred for requests up to this many tokens, see LLMRouter.preferred
+    preferred_up_to: int
+    # Whether the user-supplied API key (an OpenAI key) works with it
+    accepts_user_key: bool
+    # Whether reasoning_effort is sent, and so part of the phase cache key
+    reasoning: bool
+    # (system_prompt, data, api_key, reasoning_effort) -> stream of text chunks
+    stream: Callable[[str, dict, str | None, str], AsyncGenerator[str, None]]
+
+    def can_serve(self, token_count: int, api_key: str | None) -> bool:
+        """True if the provider fits token_count and works with the caller's key."""
+        if token_count > self.max_tokens:
+            return False
+        if api_key:
+            return self.accepts_user_key
+        return token_count <= self.wallet_limit
+
+    def phase_key(self, system_prompt: str, data: dict, reasoning_effort: str) -> str:
+        """Phase cache key of a request to this provider."""
+        return phase_output_key(
+            self.model,
+            system_prompt,
+            data,
+            reasoning_effort if self.reasoning else None,
+        )
+
+
+def _percentile(values: list[float], q: float) -> float | None:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+
+class ProviderStats:
+    """
+    Rolling statistics of one provider's recent calls: time to first token,
+    streaming speed after it and error rate. Calls older than max_age drop
+    out, so a provider traffic moved away from is tried again once its bad
+    samples have aged.
+    """
+
+    def __init__(
+        self, window: int = LLM_STATS_WINDOW, max_age: float = LLM_STATS_MAX_AGE_SECONDS
+    ):
+        self.max_age = max_age
+        # (finished at, ttft, tokens per second, ok, reasoning effort)
+        self._samples: deque[
+            tuple[float, float | None, float | None, bool, str]
+        ] = deque(maxlen=window)
+
+    def record(
+        self,
+        ttft: float | None,
+        tokens_per_second: float | None,
+        ok: bool,
+        reasoning_effort: str = "",
+    ):
+        self._samples.append(
+            (time.monotonic(), ttft, tokens_per_second, ok, reasoning_effort)
+        )
+
+    def _recent(self):
+        cutoff = time.monotonic() - self.max_age
+        while self._samples and self._samples[0][0] < cutoff:
+            self._samples.popleft()
+        return self._samples
+
+    def snapshot(self) -> dict:
+        samples = self._recent()
+        ttfts = [sample[1] for sample in samples if sample[1] is not None]
+        speeds = [sample[2] for sample in samples if sample[2] is not None]
+        errors = sum(1 for sample in samples if not sample[3])
+        return {
+            "calls": len(samples),
+            "errors": errors,
+            "error_rate": errors / len(samples) if samples else 0.0,
+            "ttft_p50": _percentile(ttfts, 0.5),
+            "ttft_p95": _percentile(ttfts, 0.95),
+            "tokens_per_second": _percentile(speeds, 0.5),
+        }
+
+    def ttft_percentile(self, q: float, reasoning_effort: str) -> float | None:
+        """
+        The q-quantile of time to first token for one reasoning effort, which
+        changes it more than anything else. None with too few samples.
+        """
+        ttfts = [
+            sample[1]
+            for sample in self._recent()
+            if sample[4] == reasoning_effort and sample[1] is not None
+        ]
+        if len(ttfts) < LLM_STATS_MIN_SAMPLES:
+            return None
+        return _percentile(ttfts, q)
+
+
+class HedgeBudget:
+    """
+    Caps backup requests to a share of all calls: every call earns ratio of
+    a backup, every backup spends one, and at most burst are saved up.
+    """
+
+    def __init__(self, ratio: float = LLM_HEDGE_BUDGET, burst: float = HEDGE_BUDGET_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._balance = 1.0
+
+    def earn(self):
+        self._balance = min(self.burst, self._balance + self.ratio)
+
+    def spend(self) -> bool:
+        if self._balance < 1:
+            return False
+        self._balance -= 1
+        return True
+
+
+class LLMRouter:
+    """
+    Picks the provider for each phase of a generation from the phase's
+    token count, the caller's API key and live statistics of every
+    provider, according to policy (see LLM_ROUTING_POLICY).
+
+    Streams started through the router are timed, so the statistics follow
+    what users currently experience. Per worker process.
+    """
+
+    def __init__(self, policy: str = LLM_ROUTING_POLICY, hedging: bool = LLM_HEDGING):
+        self.policy = policy
+        self.hedging = hedging
+        self.providers: list[LLMProvider] = []
+        self._stats: dict[str, ProviderStats] = {}
+        self._hedge_budget = HedgeBudget()
+        self.hedges = 0
+        self.hedge_wins = 0
+
+    def register(self, provider: LLMProvider):
+        """Adds a provider. Registration order breaks ties in preference."""
+        self.providers.append(provider)
+        self._stats[provider.name] = ProviderStats()
+
+    def preferred(self, token_count: int) -> LLMProvider:
+        """The provider configured for token_count, regardless of its health."""
+        for provider in self.providers:
+            if token_count <= provider.preferred_up_to:
+                return provider
+        return self.providers[-1]
+
+    def _healthy(self, stats: dict) -> bool:
+        if stats["calls"] < LLM_STATS_MIN_SAMPLES:
+            return True
+        if stats["error_rate"] > LLM_MAX_ERROR_RATE:
+            return False
+        return stats["ttft_p95"] is None or stats["ttft_p95"] <= LLM_SLOW_TTFT_SECONDS
+
+    def _expected_seconds(self, stats: dict) -> float:
+        """Expected time to a complete answer, 0 while there is too little data."""
+        if stats["calls"] < LLM_STATS_MIN_SAMPLES or stats["ttft_p50"] is None:
+            return 0.0
+        seconds = stats["ttft_p50"]
+        if stats["tokens_per_second"]:
+            seconds += EXPECTED_OUTPUT_TOKENS / stats["tokens_per_second"]
+        # Failed calls have to be retried by the user
+        return seconds / max(0.05, 1 - stats["error_rate"])
+
+    def select(
+        self,
+        token_count: int,
+        api_key: str | None = None,
+        preferred: LLMProvider | None = None,
+    ) -> LLMProvider:
+        """
+        Picks the provider for a phase.
+
+        Args:
+            token_count (int): Input tokens of the phase
+            api_key (str | None): The caller's own API key, if any
+            preferred (LLMProvider | None): The provider the whole run is
+                configured for, so every phase of a large repository stays on
+                it. Defaults to the one preferred for token_count
+
+        Returns:
+            LLMProvider: The preferred provider, or with an adaptive policy an
+                alternative that can serve the phase if that is doing better
+        """
+        preferred = preferred or self.preferred(token_count)
+        if self.policy == "static":
+            return preferred
+
+        candidates = [
+            provider
+            for provider in self.providers
+            if provider is preferred or provider.can_serve(token_count, api_key)
+        ]
+        stats = {provider.name: self._stats[provider.name].snapshot() for provider in candidates}
+
+        if self.policy == "fastest":
+            # Stable sort: preference order decides between equals, so
+            # providers without enough data are tried in that order
+            return min(candidates, key=lambda p: self._expected_seconds(stats[p.name]))
+
+        if self._healthy(stats[preferred.name]):
+            return preferred
+        alternatives = [
+            provider
+            for provider in candidates
+            if provider is not preferred and self._healthy(stats[provider.name])
+        ]
+        if not alternatives:
+            return preferred
+        choice = min(alternatives, key=lambda p: self._expected_seconds(stats[p.name]))
+        slow = stats[preferred.name]
+        print(
+            f"Routing around {preferred.name} (TTFT p95 {slow['ttft_p95'] or 0:.1f}s, "
+            f"error rate {slow['error_rate']:.0%}) to {choice.name}"
+        )
+        return choice
+
+    async def _timed(
+        self,
+        provider: LLMProvider,
+        system_prompt: str,
+        data: dict,
+        api_key: str | None,
+        reasoning_effort: str,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Streams a phase from provider and records its time to first token,
+        speed and outcome. Errors only count against the provider on our own
+        key, a user's invalid key says nothing about the provider.
+        """
+        stats = self._stats[provider.name]
+        start = time.monotonic()
+        first = None
+        chunks = 0
+        try:
+            # Closed as soon as this is, releasing the connection of a
+            # cancelled hedge right away
+            async with aclosing(
+                provider.stream(system_prompt, data, api_key, reasoning_effort)
+            ) as chunks_stream:
+                async for chunk in chunks_stream:
+                    if first is None:
+                        first = time.monotonic()
+                    chunks += 1
+                    yield chunk
+        except (asyncio.CancelledError, GeneratorExit):
+            # The client went away or a hedge won, nothing to hold against
+            # the provider here
+            raise
+        except Exception:
+            if not api_key:
+                stats.record(
+                    first - start if first else None, None, False, reasoning_effort
+                )
+            raise
+
+        end = time.monotonic()
+        # Streamed deltas carry about one token each
+        speed = (chunks - 1) / (end - first) if first and chunks > 1 and end > first else None
+        stats.record(first - start if first else None, speed, True, reasoning_effort)
+
+    def _hedge_plan(
+        self,
+        provider: LLMProvider,
+        token_count: int,
+        api_key: str | None,
+        reasoning_effort: str,
+    ) -> tuple[float, LLMProvider] | None:
+        """
+        Returns how long to wait for the first chunk before hedging, and the
+        provider the backup goes to: the best healthy alternative that can
+        serve the phase, or provider itself. None if the phase is not hedged.
+        """
+        # Backups on a user's key would spend their money
+        if not self.hedging or api_key:
+            return None
+        ttft = self._stats[provider.name].ttft_percentile(
+            LLM_HEDGE_PERCENTILE, reasoning_effort
+        )
+        if ttft is None:
+            return None
+
+        alternatives = []
+        for candidate in self.providers:
+            if candidate is provider or not candidate.can_serve(token_count, api_key):
+                continue
+            stats = self._stats[candidate.name].snapshot()
+            if stats["calls"] >= LLM_STATS_MIN_SAMPLES and self._healthy(stats):
+                alternatives.append((self._expected_seconds(stats), candidate))
+        backup = min(alternatives, key=lambda entry: entry[0])[1] if alternatives else provider
+        return max(ttft, LLM_HEDGE_MIN_DELAY_SECONDS), backup
+
+    async def stream(
+        self,
+        provider: LLMProvider,
+        system_prompt: str,
+        data: dict,
+        api_key: str | None,
+        reasoning_effort: str,
+        token_count: int,
+        on_answer: Callable[[LLMProvider], None] | None = None,
+    ) -> AsyncGenerator[str, None]:
+        """
+        Streams a phase from provider, timed for the routing statistics.
+
+        With hedging enabled, a phase that has not produced its first chunk
+        within LLM_HEDGE_PERCENTILE of the provider's observed TTFT starts
+        a backup request, budget permitting. Whichever request streams first
+        is relayed and the other is cancelled; a request that fails before
+        its first chunk leaves the field to the other.
+
+        Args:
+            provider (LLMProvider): Provider the phase was routed to
+            system_prompt (str): The phase's system prompt
+            data (dict): Variables of the phase's user message
+            api_key (str | None): The caller's own API key, if any
+            reasoning_effort (str): Reasoning effort for providers that take one
+            token_count (int): Input tokens of the phase, to pick a backup
+            on_answer (Callable[[LLMProvider], None] | None): Called with the
+                provider whose response is relayed, before its first chunk.
+                It differs from provider when a hedge wins
+
+        Yields:
+            str: Chunks of the response text
+        """
+        plan = self._hedge_plan(provider, token_count, api_key, reasoning_effort)
+        if plan is None:
+            if on_answer:
+                on_answer(provider)
+            async for chunk in self._timed(
+                provider, system_prompt, data, api_key, reasoning_effort
+            ):
+                yield chunk
+            return
+        self._hedge_budget.earn()
+        delay, backup = plan
+
+        start = time.monotonic()
+        primary = self._timed(provider, system_prompt, data, api_key, reasoning_effort)
+        streams = {primary: provider}
+        # The first chunk of each request, awaited side by side
+        firsts = {primary: asyncio.ensure_future(anext(primary))}
+        winner = None
+        try:
+            done, _ = await asyncio.wait(firsts.values(), timeout=delay)
+            if not done and self._hedge_budget.spend():
+                self.hedges += 1
+                print(
+                    f"No first chunk from {provider.name} after {delay:.1f}s, "
+                    f"hedging with {backup.name}"
+                )
+                secondary = self._timed(
+                    backup, system_prompt, data, api_key, reasoning_effort
+                )
+                streams[secondary] = backup
+                firsts[secondary] = asyncio.ensure_future(anext(secondary))
+
+            pending = set(firsts.values())
+            while winner is None:
+                done, pending = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED
+                )
+                # Several requests can finish in the same round, e.g. the
+                # primary failing just as the backup answers, so look at all
+                # of them before settling for a failure
+                for stream, first in firsts.items():
+                    if first in done and (
+                        first.exception() is None
+                        or isinstance(first.exception(), StopAsyncIteration)
+                    ):
+                        winner = stream
+                        break
+                else:
+                    # Only raise once every request has failed, with the
+                    # primary's error as it is the one that was asked for
+                    if not pending:
+                        winner = primary
+
+            if winner is not primary:
+                self.hedge_wins += 1
+            for stream, first in firsts.items():
+                if stream is not winner and not first.done():
+                    # Censored sample: its first chunk took at least this long
+                    self._stats[streams[stream].name].record(
+                        time.monotonic() - start, None, True, reasoning_effort
+                    )
+
+            if on_answer:
+                on_answer(streams[winner])
+            try:
+                chunk = firsts[winner].result()
+            except StopAsyncIteration:
+                return
+            yield chunk
+            async for chunk in winner:
+                yield chunk
+        finally:
+            # Losers, or every request if the caller stopped early
+            for stream, first in firsts.items():
+                first.cancel()
+                await asyncio.gather(first, return_exceptions=True)
+                await stream.aclose()
+
+    def stats(self) -> dict:
+        """Returns the routing policy and each provider's rolling statistics."""
+        return {
+            "policy": self.policy,
+            "hedging": self.hedging,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+            "providers": {
+                name: stats.snapshot() for name, stats in self._stats.items()
+            },
+        }
+
+
+llm_router = LLMRouter()
@@ -0,0 +1,220 @@
+import json
+import os
+import statistics
+import time
+from collections import deque
+from typing import AsyncGenerator, Callable
+
+import aiohttp
+from dotenv import load_dotenv
+
+from app.core.http_pool import get_llm_session
+from app.utils.sse import SSEDecoder
+
+load_dotenv()
+
+# JSON parser for stream chunks: "jiter" (installed with the openai SDK),
+# "orjson" if installed, or the standard library's "json"
+JSON_DECODER = os.getenv("JSON_DECODER", "jiter").lower()
+
+
+def get_json_loads(name: str = JSON_DECODER) -> Callable[[bytes], object]:
+    """
+    Returns the loads function of a JSON parser, falling back to the
+    standard library if the one asked for is not installed. Every parser
+    returned takes bytes and raises a ValueError on invalid JSON.
+    """
+    if name == "jiter":
+        try:
+            import jiter
+
+            return jiter.from_json
+        except ImportError:
+            pass
+    elif name == "orjson":
+        try:
+            import orjson
+
+            return orjson.loads
+        except ImportError:
+            pass
+    return json.loads
+
+
+_json_loads = get_json_loads()
+
+
+# Calls per provider and cache outcome whose time to first token is kept
+USAGE_TTFT_SAMPLES = 200
+
+
+class PromptCacheStats:
+    """
+    Token usage reported by providers at the end of each stream, with how
+    much of the prompt was served from their prefix cache, and time to first
+    token of calls with and without a cache hit. Per worker process.
+    """
+
+    def __init__(self):
+        self._providers: dict[str, dict] = {}
+
+    def record(self, provider_name: str, usage: dict, ttft: float | None):
+        """
+        Adds the usage of one call.
+
+        Args:
+            provider_name (str): Provider the call went to
+            usage (dict): The usage object of the stream's final chunk
+            ttft (float | None): Seconds until the first content, if any
+        """
+        entry = self._providers.setdefault(
+            provider_name,
+            {
+                "calls": 0,
+                "cache_hits": 0,
+                "prompt_tokens": 0,
+                "cached_tokens": 0,
+                "completion_tokens": 0,
+                "ttft_hit": deque(maxlen=USAGE_TTFT_SAMPLES),
+                "ttft_miss": deque(maxlen=USAGE_TTFT_SAMPLES),
+            },
+        )
+        cached = cached_prompt_tokens(usage)
+        entry["calls"] += 1
+        entry["cache_hits"] += bool(cached)
+        entry["prompt_tokens"] += usage.get("prompt_tokens") or 0
+        entry["cached_tokens"] += cached
+        entry["completion_tokens"] += usage.get("completion_tokens") or 0
+        if ttft is not None:
+            entry["ttft_hit" if cached else "ttft_miss"].append(ttft)
+
+    def stats(self) -> dict:
+        return {
+            name: {
+                "calls": entry["calls"],
+                "cache_hits": entry["cache_hits"],
+                "prompt_tokens": entry["prompt_tokens"],
+                "cached_tokens": entry["cached_tokens"],
+                "cached_share": entry["cached_tokens"] / entry["prompt_tokens"]
+                if entry["prompt_tokens"]
+                else 0.0,
+                "completion_tokens": entry["completion_tokens"],
+                "ttft_p50_cache_hit": statistics.median(entry["ttft_hit"])
+                if entry["ttft_hit"]
+                else None,
+                "ttft_p50_cache_miss": statistics.median(entry["ttft_miss"])
+                if entry["ttft_miss"]
+                else None,
+            }
+            for name, entry in self._providers.items()
+        }
+
+
+prompt_cache_stats = PromptCacheStats()
+
+
+def cached_prompt_tokens(usage: dict) -> int:
+    """Prompt tokens served from the provider's prefix cache, as OpenAI or DeepSeek report them."""
+    details = usage.get("prompt_tokens_details") or {}
+    cached = details.get("cached_tokens")
+    if cached is None:
+        cached = usage.get("prompt_cache_hit_tokens")
+    return cached or 0
+
+
+def _delta_content(chunk: dict) -> str | None:
+    choices = chunk.get("choices")
+    if not choices:
+        return None
+    delta = choices[0].get("delta")
+    return delta.get("content") if delta else None
+
+
+async def stream_chat_completion(
+    provider: str,
+    provider_name: str,
+    url: str,
+    headers: dict,
+    payload: dict,
+) -> AsyncGenerator[str, None]:
+    """
+    Streams a chat completion from an OpenAI-compatible API and yields the
+    content of each delta. Shared by every provider service.
+
+    The body is read as raw bytes and fed to an SSEDecoder, so comments such
+    as OpenRouter's keep-alives, multi-line events and frames split across
+    reads are all handled in one place, and each event's data goes to the
+    JSON parser without being decoded to str first.
+
+    The usage a provider reports at the end of the stream, when the payload
+    asks for it with stream_options, is recorded in prompt_cache_stats.
+
+    Args:
+        provider (str): Pooled session to use, see get_llm_session
+        provider_name (str): Name used in log lines and errors, e.g. "OpenAI"
+        url (str): Chat completions endpoint
+        headers (dict): Request headers, including authorization
+        payload (dict): Request body, with "stream": True
+
+    Yields:
+        str: Chunks of the response text
+
+    Raises:
+        ValueError: If the API answers with an error status or an error
+            event, or cannot be reached
+    """
+    decoder = SSEDecoder()
+    loads = _json_loads
+    events = 0
+    start = time.monotonic()
+    ttft = None
+    usage = None
+    try:
+        session = get_llm_session(provider)
+        async with session.post(url, headers=headers, json=payload) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                print(f"Error response: {error_text}")
+                raise ValueError(
+                    f"{provider_name} API returned status code {response.status}: {error_text}"
+                )
+
+            async for received in response.content.iter_any():
+                for _, data in decoder.feed(received):
+                    events += 1
+                    if data == b"[DONE]":
+                        break
+                    try:
+                        chunk = loads(data)
+                    except ValueError as e:
+                        print(f"JSON decode error: {e} for event: {data[:200]!r}")
+                        continue
+                    if "error" in chunk:
+                        raise ValueError(
+                            f"{provider_name} API returned an error: {chunk['error']}"
+                        )
+                    if chunk.get("usage"):
+                        usage = chunk["usage"]
+                    content = _delta_content(chunk)
+                    if content:
+                        if ttft is None:
+                            ttft = time.monotonic() - start
+                        yield content
+                else:
+                    continue
+                break
+
+            if events == 0:
+                print("Warning: No events received in stream response")
+
+        if usage:
+            prompt_cache_stats.record(provider_name, usage, ttft)
+            print(
+                f"{provider_name} usage: {usage.get('prompt_tokens', 0):,} prompt tokens, "
+                f"{cached_prompt_tokens(usage):,} cached, "
+                f"{usage.get('completion_tokens', 0):,} completion"
+            )
+
+    except aiohttp.ClientError as e:
+        print(f"Connection error: {str(e)}")
+        raise ValueError(f"Failed to connect to {provider_name} API: {str(e)}")
@@ -0,0 +1,193 @@
+from app.services.github_service import RepoSnapshot
+from app.utils.path_filter import PathFilter, default_path_filter
+from dotenv import load_dotenv
+import asyncio
+import io
+import os
+import re
+
+load_dotenv()
+
+# Directory holding local clones or bare mirrors as <owner>/<repo> or <owner>/<repo>.git
+LOCAL_REPOS_ROOT = os.getenv("LOCAL_REPOS_ROOT", "")
+# Read size for streamed git output
+GIT_CHUNK_SIZE = 64 * 1024
+
+# GitHub owner and repository names, which also rules out path traversal
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9_.-]+$")
+
+
+class GitCommandError(Exception):
+    """Raised when git ran but failed, e.g. on a missing ref or an empty repository."""
+
+
+async def _spawn_git(path, *args, stdout, stderr) -> asyncio.subprocess.Process:
+    """
+    Starts git in path. A git that cannot be run at all is a deployment
+    problem, not a missing repository, so it is reported as such.
+    """
+    try:
+        return await asyncio.create_subprocess_exec(
+            "git", "-C", path, *args, stdout=stdout, stderr=stderr
+        )
+    except OSError as e:
+        raise Exception(
+            f"Could not run git, which REPO_SOURCE=local requires: {str(e)}"
+        ) from e
+
+
+class LocalGitService:
+    """
+    Reads repositories straight from local clones or bare mirrors with git,
+    exposing the same snapshot interface as GitHubService without any
+    network access or rate limits.
+    """
+
+    def __init__(
+        self, root: str = LOCAL_REPOS_ROOT, path_filter: PathFilter | None = None
+    ):
+        self.root = root
+        # Excludes static files and generated code from file trees
+        self.path_filter = path_filter or default_path_filter
+
+    def _repo_path(self, username, repo):
+        if not self.root:
+            raise Exception("LOCAL_REPOS_ROOT must be set to read local repositories")
+        if not all(
+            _NAME_PATTERN.match(name) and name not in (".", "..")
+            for name in (username, repo)
+        ):
+            raise ValueError("Repository not found.")
+
+        for candidate in (f"{repo}.git", repo):
+            path = os.path.join(self.root, username, candidate)
+            if os.path.isdir(path):
+                return path
+        raise ValueError("Repository not found.")
+
+    async def _git(self, path, *args) -> bytes:
+        process = await _spawn_git(
+            path,
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise GitCommandError(
+                f"git {args[0]} failed: {stderr.decode('utf-8', errors='replace').strip()}"
+            )
+        return stdout
+
+    async def get_head_commit(self, username, repo, etag=None):
+        """
+        Resolves the commit SHA HEAD points to.
+
+        Returns:
+            tuple[str, None]: The commit SHA. There is no ETag for local reads,
+            the tuple mirrors GitHubService.get_head_commit.
+
+        Raises:
+            ValueError: If the repository does not exist or is empty.
+            Exception: If git cannot be run.
+        """
+        path = self._repo_path(username, repo)
+        try:
+            sha = await self._git(path, "rev-parse", "--verify", "HEAD^{commit}")
+        except GitCommandError:
+            raise ValueError(
+                "Could not fetch repository file tree. Repository might not exist, be empty or private."
+            )
+        return sha.decode().strip(), None
+
+    async def get_default_branch(self, username, repo):
+        """Get the branch HEAD points to."""
+        path = self._repo_path(username, repo)
+        try:
+            return (await self._git(path, "symbolic-ref", "--short", "HEAD")).decode().strip()
+        except GitCommandError:
+            return None
+
+    async def get_github_file_paths_as_list(self, username, repo, ref="HEAD"):
+        """
+        Lists the file tree at ref with git ls-tree, excluding static files
+        and generated code. Like GitHub's recursive listing it includes
+        directory entries, which end with "/".
+
+        Returns:
+            str: A filtered and formatted string of file paths in the repository, one per line.
+        """
+        path = self._repo_path(username, repo)
+        process = await _spawn_git(
+            path,
+            "ls-tree",
+            "-r",
+            "-t",
+            "-z",
+            ref,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+
+        # Stream NUL separated "<mode> <type> <object>\t<path>" records through
+        # the filter as git produces them
+        dir_cache: dict[str, bool] = {}
+        file_tree = io.StringIO()
+        pending = b""
+        while chunk := await process.stdout.read(GIT_CHUNK_SIZE):  # type: ignore
+            *records, pending = (pending + chunk).split(b"\0")
+            paths = []
+            for record in records:
+                info, _, name = record.partition(b"\t")
+                path = name.decode("utf-8", errors="replace")
+                paths.append(path + "/" if b" tree " in info else path)
+            for kept in self.path_filter.filter(paths, dir_cache):
+                if file_tree.tell():
+                    file_tree.write("\n")
+                file_tree.write(kept)
+
+        if await process.wait() != 0:
+            raise ValueError(
+                "Could not fetch repository file tree. Repository might not exist, be empty or private."
+            )
+        return file_tree.getvalue()
+
+    async def get_github_readme(self, username, repo, ref="HEAD"):
+        """
+        Reads the README at the root of the tree at ref.
+
+        Raises:
+            ValueError: If the repository has no README.
+        """
+        path = self._repo_path(username, repo)
+        names = (await self._git(path, "ls-tree", "--name-only", ref)).decode().splitlines()
+        readmes = sorted(
+            (name for name in names if name.lower().startswith("readme")),
+            # Prefer markdown the way GitHub does
+            key=lambda name: (not name.lower().endswith(".md"), name),
+        )
+        if not readmes:
+            raise ValueError("No README found for the specified repository.")
+
+        content = await self._git(path, "cat-file", "blob", f"{ref}:{readmes[0]}")
+        return content.decode("utf-8", errors="replace")
+
+    async def get_repo_snapshot(self, username, repo, ref="HEAD"):
+        """
+        Reads everything needed to diagram a repository from the local copy.
+
+        Returns:
+            RepoSnapshot: Default branch, filtered file tree, README and visibility.
+            Local repositories are treated as public to the deployment.
+        """
+        default_branch, file_tree, readme = await asyncio.gather(
+            self.get_default_branch(username, repo),
+            self.get_github_file_paths_as_list(username, repo, ref=ref),
+            self.get_github_readme(username, repo, ref=ref),
+        )
+        return RepoSnapshot(
+            default_branch=default_branch or "main",
+            file_tree=file_tree,
+            readme=readme,
+            private=False,
+        )
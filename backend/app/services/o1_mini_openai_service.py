@@ -1,10 +1,10 @@
 from openai import OpenAI
 from dotenv import load_dotenv
+from app.core.http_pool import user_client_pool
+from app.services.llm_stream import stream_chat_completion
 from app.utils.format_message import format_user_message
-import tiktoken
+from app.utils.token_counter import count_tokens
 import os
-import aiohttp
-import json
 from typing import AsyncGenerator
 
 load_dotenv()
@@ -15,7 +15,6 @@ class OpenAIO1Service:
         self.default_client = OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
         )
-        self.encoding = tiktoken.get_encoding("o200k_base")  # Encoder for OpenAI models
         self.base_url = "https://api.openai.com/v1/chat/completions"
 
     def call_o1_api(
@@ -39,7 +38,7 @@ class OpenAIO1Service:
         user_message = format_user_message(data)
 
         # Use custom client if API key provided, otherwise use default
-        client = OpenAI(api_key=api_key) if api_key else self.default_client
+        client = user_client_pool.get(api_key) if api_key else self.default_client
 
         try:
             print(
@@ -111,52 +110,10 @@ class OpenAIO1Service:
             "stream": True,
         }
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url, headers=headers, json=payload
-                ) as response:
-
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"Error response: {error_text}")
-                        raise ValueError(
-                            f"OpenAI API returned status code {response.status}: {error_text}"
-                        )
-
-                    line_count = 0
-                    async for line in response.content:
-                        line = line.decode("utf-8").strip()
-                        if not line:
-                            continue
-
-                        line_count += 1
-
-                        if line.startswith("data: "):
-                            if line == "data: [DONE]":
-                                break
-                            try:
-                                data = json.loads(line[6:])
-                                content = (
-                                    data.get("choices", [{}])[0]
-                                    .get("delta", {})
-                                    .get("content")
-                                )
-                                if content:
-                                    yield content
-                            except json.JSONDecodeError as e:
-                                print(f"JSON decode error: {e} for line: {line}")
-                                continue
-
-                    if line_count == 0:
-                        print("Warning: No lines received in stream response")
-
-        except aiohttp.ClientError as e:
-            print(f"Connection error: {str(e)}")
-            raise ValueError(f"Failed to connect to OpenAI API: {str(e)}")
-        except Exception as e:
-            print(f"Unexpected error in streaming API call: {str(e)}")
-            raise
+        async for content in stream_chat_completion(
+            "openai", "OpenAI", self.base_url, headers, payload
+        ):
+            yield content
 
     def count_tokens(self, prompt: str) -> int:
         """
@@ -168,5 +125,4 @@ class OpenAIO1Service:
         Returns:
             int: Estimated number of input tokens
         """
-        num_tokens = len(self.encoding.encode(prompt))
-        return num_tokens
+        return count_tokens(prompt)
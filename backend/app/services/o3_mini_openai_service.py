@@ -1,10 +1,13 @@
 from openai import OpenAI
 from dotenv import load_dotenv
-from app.utils.format_message import format_user_message
-import tiktoken
+from app.core.http_pool import user_client_pool
+from app.services.llm_stream import stream_chat_completion
+from app.utils.format_message import (
+    format_prompt_messages,
+    format_user_message,
+)
+from app.utils.token_counter import count_tokens
 import os
-import aiohttp
-import json
 from typing import AsyncGenerator, Literal
 
 load_dotenv()
@@ -15,7 +18,6 @@ class OpenAIo3Service:
         self.default_client = OpenAI(
             api_key=os.getenv("OPENAI_API_KEY"),
         )
-        self.encoding = tiktoken.get_encoding("o200k_base")  # Encoder for OpenAI models
         self.base_url = "https://api.openai.com/v1/chat/completions"
 
     def call_o3_api(
@@ -40,7 +42,7 @@ class OpenAIo3Service:
         user_message = format_user_message(data)
 
         # Use custom client if API key provided, otherwise use default
-        client = OpenAI(api_key=api_key) if api_key else self.default_client
+        client = user_client_pool.get(api_key) if api_key else self.default_client
 
         try:
             print(
@@ -87,8 +89,8 @@ class OpenAIo3Service:
         Yields:
             str: Chunks of o3-mini's response text
         """
-        # Create the user message with the data
-        user_message = format_user_message(data)
+        # Shared context first so providers can reuse its cached prefix
+        messages = format_prompt_messages(system_prompt, data)
 
         headers = {
             "Content-Type": "application/json",
@@ -116,61 +118,18 @@ class OpenAIo3Service:
 
         payload = {
             "model": "o3-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ],
+            "messages": messages,
             "max_completion_tokens": 12000,
             "stream": True,
+            # Final chunk reports usage, including cached prompt tokens
+            "stream_options": {"include_usage": True},
             "reasoning_effort": reasoning_effort,
         }
 
-        try:
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.base_url, headers=headers, json=payload
-                ) as response:
-
-                    if response.status != 200:
-                        error_text = await response.text()
-                        print(f"Error response: {error_text}")
-                        raise ValueError(
-                            f"OpenAI API returned status code {response.status}: {error_text}"
-                        )
-
-                    line_count = 0
-                    async for line in response.content:
-                        line = line.decode("utf-8").strip()
-                        if not line:
-                            continue
-
-                        line_count += 1
-
-                        if line.startswith("data: "):
-                            if line == "data: [DONE]":
-                                break
-                            try:
-                                data = json.loads(line[6:])
-                                content = (
-                                    data.get("choices", [{}])[0]
-                                    .get("delta", {})
-                                    .get("content")
-                                )
-                                if content:
-                                    yield content
-                            except json.JSONDecodeError as e:
-                                print(f"JSON decode error: {e} for line: {line}")
-                                continue
-
-                    if line_count == 0:
-                        print("Warning: No lines received in stream response")
-
-        except aiohttp.ClientError as e:
-            print(f"Connection error: {str(e)}")
-            raise ValueError(f"Failed to connect to OpenAI API: {str(e)}")
-        except Exception as e:
-            print(f"Unexpected error in streaming API call: {str(e)}")
-            raise
+        async for content in stream_chat_completion(
+            "openai", "OpenAI", self.base_url, headers, payload
+        ):
+            yield content
 
     def count_tokens(self, prompt: str) -> int:
         """
@@ -182,5 +141,4 @@ class OpenAIo3Service:
         Returns:
             int: Estimated number of input tokens
         """
-        num_tokens = len(self.encoding.encode(prompt))
-        return num_tokens
+        return count_tokens(prompt)
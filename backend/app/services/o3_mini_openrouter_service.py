@@ -1,10 +1,13 @@
 from openai import OpenAI
 from dotenv import load_dotenv
-from app.utils.format_message import format_user_message
-import tiktoken
+from app.core.http_pool import user_client_pool
+from app.services.llm_stream import stream_chat_completion
+from app.utils.format_message import (
+    format_prompt_messages,
+    format_user_message,
+)
+from app.utils.token_counter import count_tokens
 import os
-import aiohttp
-import json
 from typing import Literal, AsyncGenerator
 
 load_dotenv()
@@ -16,7 +19,6 @@ class OpenRouterO3Service:
             base_url="https://openrouter.ai/api/v1",
             api_key=os.getenv("OPENROUTER_API_KEY"),
         )
-        self.encoding = tiktoken.get_encoding("o200k_base")
         self.base_url = "https://openrouter.ai/api/v1/chat/completions"
 
     def call_o3_api(
@@ -42,7 +44,7 @@ class OpenRouterO3Service:
 
         # Use custom client if API key provided, otherwise use default
         client = (
-            OpenAI(base_url="https://openrouter.ai/api/v1", api_key=api_key)
+            user_client_pool.get(api_key, base_url="https://openrouter.ai/api/v1")
             if api_key
             else self.default_client
         )
@@ -85,8 +87,8 @@ class OpenRouterO3Service:
         Yields:
             str: Chunks of O3's response text
         """
-        # Create the user message with the data
-        user_message = format_user_message(data)
+        # Shared context first so providers can reuse its cached prefix
+        messages = format_prompt_messages(system_prompt, data)
 
         headers = {
             "HTTP-Referer": "https://gitdiagram.com",
@@ -97,37 +99,19 @@ class OpenRouterO3Service:
 
         payload = {
             "model": "openai/o3-mini",
-            "messages": [
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_message},
-            ],
+            "messages": messages,
             "max_tokens": 12000,
             "temperature": 0.2,
             "stream": True,
+            # Final chunk reports usage, including cached prompt tokens
+            "stream_options": {"include_usage": True},
             "reasoning_effort": reasoning_effort,
         }
 
-        buffer = ""
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                self.base_url, headers=headers, json=payload
-            ) as response:
-                async for line in response.content:
-                    line = line.decode("utf-8").strip()
-                    if line.startswith("data: "):
-                        if line == "data: [DONE]":
-                            break
-                        try:
-                            data = json.loads(line[6:])
-                            if (
-                                content := data.get("choices", [{}])[0]
-                                .get("delta", {})
-                                .get("content")
-                            ):
-                                yield content
-                        except json.JSONDecodeError:
-                            # Skip any non-JSON lines (like the OPENROUTER PROCESSING comments)
-                            continue
+        async for content in stream_chat_completion(
+            "openrouter", "OpenRouter", self.base_url, headers, payload
+        ):
+            yield content
 
     def count_tokens(self, prompt: str) -> int:
         """
@@ -140,5 +124,4 @@ class OpenRouterO3Service:
         Returns:
             int: Estimated number of input tokens
         """
-        num_tokens = len(self.encoding.encode(prompt))
-        return num_tokens
+        return count_tokens(prompt)
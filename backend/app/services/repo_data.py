@@ -0,0 +1,182 @@
+from app.core.memory_cache import ByteBudgetCache
+from app.core.repo_store import RepoStore
+from app.core.single_flight import SingleFlight
+from app.services.github_service import GitHubService, RepositoryLookupError
+from app.services.local_git_service import LocalGitService
+from app.utils.path_filter import default_path_filter
+from dotenv import load_dotenv
+import asyncio
+import os
+
+load_dotenv()
+
+# Memory budget per worker for cached github data (compressed size)
+GITHUB_DATA_CACHE_MAX_BYTES = int(
+    os.getenv("GITHUB_DATA_CACHE_MAX_BYTES", str(64 * 1024 * 1024))
+)
+# How long an in-memory entry is served before HEAD is revalidated with GitHub
+GITHUB_REVALIDATE_SECONDS = float(os.getenv("GITHUB_REVALIDATE_SECONDS", "60"))
+# Memory budget per worker for file trees as they are sent to the model
+# (compressed size), see prompt_tree_cache
+PROMPT_TREE_CACHE_MAX_BYTES = int(
+    os.getenv("PROMPT_TREE_CACHE_MAX_BYTES", str(32 * 1024 * 1024))
+)
+# How long a failed lookup (missing repo, README or tree) is answered from
+# memory. Rate limits and GitHub server errors are never cached
+GITHUB_FAILURE_TTL_SECONDS = float(os.getenv("GITHUB_FAILURE_TTL_SECONDS", "60"))
+# Where repositories are read from: "github", or "local" for clones and bare
+# mirrors under LOCAL_REPOS_ROOT
+REPO_SOURCE = os.getenv("REPO_SOURCE", "github").lower()
+
+# Format of the file trees GitHubService lists, bumped when it changes.
+# 2: directory entries end with "/"
+TREE_LISTING_VERSION = 2
+
+# Persisted snapshots are keyed by commit, which never changes, so trees
+# listed in an older format or under other path filter rules are told
+# apart by version and refetched
+repo_store = RepoStore(
+    tree_version=f"{TREE_LISTING_VERSION}:{default_path_filter.fingerprint}"
+)
+github_data_cache = ByteBudgetCache(
+    max_bytes=GITHUB_DATA_CACHE_MAX_BYTES, ttl=GITHUB_REVALIDATE_SECONDS
+)
+# Error messages of failed lookups, so bots and typo'd URLs repeating them
+# don't spend GitHub quota
+github_failure_cache = ByteBudgetCache(
+    max_bytes=1024 * 1024, ttl=GITHUB_FAILURE_TTL_SECONDS
+)
+# File trees formatted, and summarized if needed, for the prompt, keyed by
+# commit, format and token budget so /cost and /stream format a tree once.
+# Entries are pinned to a commit and never go stale
+prompt_tree_cache = ByteBudgetCache(max_bytes=PROMPT_TREE_CACHE_MAX_BYTES)
+# Concurrent requests for the same repo share one GitHub round trip
+_github_data_flights = SingleFlight()
+_snapshot_flights = SingleFlight()
+
+local_git_service = LocalGitService()
+
+
+async def _fetch_snapshot(
+    service: GitHubService, username: str, repo: str, commit_sha: str
+) -> dict:
+    """Fetches the repo at commit_sha from GitHub and persists it."""
+    snapshot = await service.get_repo_snapshot(username, repo, ref=commit_sha)
+    github_data = {
+        "default_branch": snapshot.default_branch,
+        "file_tree": snapshot.file_tree,
+        "readme": snapshot.readme,
+        "private": snapshot.private,
+        "commit_sha": commit_sha,
+    }
+    await asyncio.to_thread(
+        repo_store.put_snapshot, username, repo, commit_sha, github_data
+    )
+    return github_data
+
+
+async def _load_github_data(service: GitHubService, username: str, repo: str) -> dict:
+    """
+    Loads github data for the repo's current HEAD commit, going to the
+    persistent store first and to GitHub only for commits never seen before.
+    """
+    head = await asyncio.to_thread(repo_store.get_head, username, repo)
+    commit_sha, etag = await service.get_head_commit(
+        username, repo, etag=head[1] if head else None
+    )
+    if commit_sha is None:  # 304 Not Modified, HEAD has not moved
+        commit_sha = head[0]  # type: ignore
+    else:
+        await asyncio.to_thread(repo_store.set_head, username, repo, commit_sha, etag)
+
+    github_data = await asyncio.to_thread(
+        repo_store.get_snapshot, username, repo, commit_sha
+    )
+    if github_data is not None:
+        return github_data
+
+    # Callers reach this point only after resolving HEAD with their own
+    # credential, so a snapshot fetched for one of them can serve the others.
+    return await _snapshot_flights.do(
+        (username.lower(), repo.lower(), commit_sha),
+        lambda: _fetch_snapshot(service, username, repo, commit_sha),
+    )
+
+
+async def _fetch_local_snapshot(username: str, repo: str, commit_sha: str) -> dict:
+    """Reads the repo at commit_sha from its local clone or mirror."""
+    snapshot = await local_git_service.get_repo_snapshot(username, repo, ref=commit_sha)
+    return {
+        "default_branch": snapshot.default_branch,
+        "file_tree": snapshot.file_tree,
+        "readme": snapshot.readme,
+        "private": snapshot.private,
+        "commit_sha": commit_sha,
+    }
+
+
+async def _get_local_github_data(username: str, repo: str) -> dict:
+    """
+    Serves github data from local git. Resolving HEAD takes a few
+    milliseconds, so it is checked on every call and the snapshot is cached
+    by commit; the clone itself plays the role of the persistent store.
+    """
+    commit_sha, _ = await local_git_service.get_head_commit(username, repo)
+    cache_key = ("local", username.lower(), repo.lower(), commit_sha)
+    github_data = github_data_cache.get(cache_key)
+    if github_data is not None:
+        return github_data
+
+    github_data = await _snapshot_flights.do(
+        cache_key, lambda: _fetch_local_snapshot(username, repo, commit_sha)
+    )
+    # Entries are pinned to a commit and can never go stale
+    github_data_cache.set(cache_key, github_data, ttl=float("inf"))
+    return github_data
+
+
+# cache github data to avoid double API calls from cost and generate
+async def get_cached_github_data(
+    username: str, repo: str, github_pat: str | None = None
+):
+    if REPO_SOURCE == "local":
+        return await _get_local_github_data(username, repo)
+
+    # Create a new service instance for each call with the appropriate PAT
+    current_github_service = GitHubService(pat=github_pat)
+
+    # Public repos are shared by every caller whatever credential they bring,
+    # private ones are only visible to callers with the same credential scope.
+    public_key = ("public", username.lower(), repo.lower())
+    private_key = (
+        "private",
+        username.lower(),
+        repo.lower(),
+        current_github_service.credential_scope(),
+    )
+    for cache_key in (public_key, private_key):
+        github_data = github_data_cache.get(cache_key)
+        if github_data is not None:
+            return github_data
+
+    # Failures are kept per credential scope: a repo missing for one caller
+    # may be a private repo another caller can read.
+    error = github_failure_cache.get(private_key)
+    if error is not None:
+        raise RepositoryLookupError(error)
+
+    try:
+        github_data = await _github_data_flights.do(
+            private_key,
+            lambda: _load_github_data(current_github_service, username, repo),
+        )
+    except RepositoryLookupError as e:
+        # Missing repository, README or tree. Rate limits and server errors
+        # are transient and not remembered
+        github_failure_cache.set(private_key, str(e))
+        raise
+
+    github_data_cache.set(
+        private_key if github_data["private"] else public_key, github_data
+    )
+    return github_data
@@ -0,0 +1,302 @@
+from app.utils.token_counter import estimate_tokens
+from collections import Counter
+from dotenv import load_dotenv
+import os
+
+load_dotenv()
+
+# How file trees are written into prompts: "compact" for an indented tree,
+# "paths" for one full path per line as listed by GitHub
+FILE_TREE_FORMAT = os.getenv("FILE_TREE_FORMAT", "compact").lower()
+# Indentation per tree level
+INDENT = "  "
+
+# Directories whose contents say little about architecture, summarized
+# first when a tree has to shrink
+LOW_SIGNAL_DIRS = {
+    "fixtures", "__fixtures__", "testdata", "test_data", "test-data",
+    "__snapshots__", "snapshots", "__mocks__", "mocks", "generated",
+    "__generated__", "gen", "dist", "build", "out", "target", "coverage",
+    "locale", "locales", "i18n", "translations", "static", "public",
+    "migrations", "third_party", "thirdparty", "external",
+}
+# Files that anchor a component, kept even inside summarized directories
+KEY_FILE_NAMES = {
+    "package.json", "pyproject.toml", "setup.py", "requirements.txt", "go.mod",
+    "cargo.toml", "pom.xml", "build.gradle", "build.gradle.kts", "gemfile",
+    "composer.json", "dockerfile", "docker-compose.yml", "docker-compose.yaml",
+    "makefile", "main.py", "__main__.py", "app.py", "manage.py", "main.go",
+    "main.rs", "lib.rs", "main.ts", "main.js", "server.ts", "server.js",
+    "server.py", "program.cs",
+}
+# Key files listed per summarized directory
+MAX_KEY_FILES = 5
+# Files of one extension in one directory listed before the rest are counted
+SIBLING_LIST_LIMIT = 12
+SIBLING_KEEP = 3
+
+
+def _build_trie(file_tree: str) -> dict:
+    # Prefix trie of nested dicts, insertion order preserves the input order.
+    # Files are empty dicts, so a directory entry whose contents were all
+    # filtered out is renamed to end with "/" to keep it from reading as one
+    root: dict = {}
+    directories = []
+    for path in file_tree.splitlines():
+        node = parent = root
+        name = ""
+        for part in path.split("/"):
+            if part:
+                parent, name = node, part
+                node = node.setdefault(part, {})
+        if path.endswith("/") and name:
+            directories.append((parent, name))
+
+    empty: dict[int, tuple[dict, set]] = {}
+    for parent, name in directories:
+        if not parent[name]:
+            empty.setdefault(id(parent), (parent, set()))[1].add(name)
+    for parent, names in empty.values():
+        entries = list(parent.items())
+        parent.clear()
+        parent.update((f"{key}/" if key in names else key, node) for key, node in entries)
+    return root
+
+
+def _is_file(name: str, node: dict) -> bool:
+    return not node and not name.endswith("/")
+
+
+def _join_single_children(name: str, node: dict) -> tuple[str, dict]:
+    """Follows a chain of directories that only contain one subdirectory."""
+    while len(node) == 1:
+        ((child, grandchild),) = node.items()
+        if not grandchild:
+            break
+        name, node = f"{name}/{child}", grandchild
+    return name, node
+
+
+def compact_file_tree(file_tree: str) -> str:
+    """
+    Rewrites a list of paths as an indented tree, so each directory name is
+    written once instead of once per path below it:
+
+        src/main/java/
+          App.java
+          util/
+            Strings.java
+
+    Directories end with "/" and chains of directories that contain nothing
+    but one subdirectory are joined on one line. Entries keep the order of
+    the input, so a sorted listing stays sorted.
+
+    Args:
+        file_tree (str): Paths, one per line, including or omitting the
+            entries of directories themselves. Directory entries ending with
+            "/" are written as directories even when nothing is listed below
+            them
+
+    Returns:
+        str: The indented tree, one entry per line
+    """
+    root = _build_trie(file_tree)
+    lines = []
+    # Explicit stack instead of recursion, trees can be deeper than the
+    # interpreter's recursion limit
+    stack = [(iter(root.items()), 0)]
+    while stack:
+        children, depth = stack[-1]
+        entry = next(children, None)
+        if entry is None:
+            stack.pop()
+            continue
+        name, node = entry
+        if not node:
+            lines.append(INDENT * depth + name)
+            continue
+        name, node = _join_single_children(name, node)
+        lines.append(f"{INDENT * depth}{name}/")
+        stack.append((iter(node.items()), depth + 1))
+
+    return "\n".join(lines)
+
+
+def _extension(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+def _summary(node: dict, with_key_files: bool) -> tuple[int, str, list[str]]:
+    """
+    Counts the files below a directory, describes them, e.g.
+    "(4,812 files: .json)", and lists the key files among them by their path
+    relative to it.
+    """
+    files = 0
+    extensions: Counter = Counter()
+    key_files = []
+    stack = [("", node)]
+    while stack:
+        prefix, current = stack.pop()
+        for name, child in current.items():
+            if child:
+                stack.append((f"{prefix}{name}/", child))
+                continue
+            if not _is_file(name, child):
+                continue
+            files += 1
+            extension = _extension(name)
+            if extension:
+                extensions[extension] += 1
+            if with_key_files and name.lower() in KEY_FILE_NAMES:
+                key_files.append(prefix + name)
+
+    kinds = ", ".join(extension for extension, _ in extensions.most_common(3))
+    description = f"({files:,} {'file' if files == 1 else 'files'}{': ' + kinds if kinds else ''})"
+    key_files.sort(key=lambda path: (path.count("/"), path))
+    return files, description, key_files[:MAX_KEY_FILES]
+
+
+def _render_summarized(
+    root: dict,
+    max_depth: int | None,
+    collapse_low_signal: bool,
+    trim_siblings: bool,
+    summaries: dict,
+) -> str:
+    """
+    Writes the trie like compact_file_tree, summarizing directories at
+    max_depth, low-signal directories and long same-extension file lists.
+    Directory summaries are memoized in summaries across renders.
+    """
+    lines = []
+
+    def push(node, depth):
+        # Extensions with too many files directly in this directory
+        counts = Counter(
+            _extension(name) for name, child in node.items() if _is_file(name, child)
+        )
+        overflow = (
+            {
+                extension: count
+                for extension, count in counts.items()
+                if extension and count > SIBLING_LIST_LIMIT
+            }
+            if trim_siblings
+            else {}
+        )
+        stack.append((iter(node.items()), depth, overflow, Counter()))
+
+    stack: list = []
+    push(root, 0)
+    while stack:
+        children, depth, overflow, listed = stack[-1]
+        entry = next(children, None)
+        if entry is None:
+            stack.pop()
+            continue
+        name, node = entry
+        indent = INDENT * depth
+
+        if not node:
+            extension = _extension(name)
+            if extension in overflow and name.lower() not in KEY_FILE_NAMES:
+                listed[extension] += 1
+                if listed[extension] == SIBLING_KEEP + 1:
+                    remaining = overflow[extension] - SIBLING_KEEP
+                    lines.append(f"{indent}... ({remaining:,} more {extension} files)")
+                if listed[extension] > SIBLING_KEEP:
+                    continue
+            lines.append(indent + name)
+            continue
+
+        name, node = _join_single_children(name, node)
+        low_signal = collapse_low_signal and any(
+            part.lower() in LOW_SIGNAL_DIRS for part in name.split("/")
+        )
+        if low_signal or (max_depth is not None and depth >= max_depth):
+            key = (id(node), low_signal)
+            if key not in summaries:
+                summaries[key] = _summary(node, with_key_files=not low_signal)
+            files, description, key_files = summaries[key]
+            # A summary of a handful of files saves nothing
+            if low_signal or files > SIBLING_KEEP:
+                lines.append(f"{indent}{name}/ {description}")
+                lines.extend(f"{indent}{INDENT}{path}" for path in key_files)
+                continue
+
+        lines.append(f"{indent}{name}/")
+        push(node, depth + 1)
+
+    return "\n".join(lines)
+
+
+def _depth(root: dict) -> int:
+    depth = 0
+    stack = [(root, 0)]
+    while stack:
+        node, level = stack.pop()
+        depth = max(depth, level)
+        stack.extend((child, level + 1) for child in node.values() if child)
+    return depth
+
+
+def summarize_file_tree(file_tree: str, max_tokens: int) -> str:
+    """
+    Shrinks a file tree to fit a token budget, giving up detail where it
+    says least about the architecture. Each step is only taken if the
+    previous one was not enough:
+
+        1. The compact tree, unchanged.
+        2. Low-signal directories (fixtures, generated code, build output,
+           translations, ...) become one line, e.g.
+           "tests/fixtures/ (4,812 files: .json)", and directories list only
+           the first few of a long run of same-extension files.
+        3. Directories below the deepest level that still fits are
+           summarized the same way, keeping key files such as manifests,
+           Dockerfiles and entry points verbatim.
+
+    Top-level structure is never dropped, so the result can still exceed
+    max_tokens for repositories with extremely wide top levels. The result
+    is in the compact format even when FILE_TREE_FORMAT is "paths": summary
+    lines describe directories, which a flat path list has no place for.
+
+    Args:
+        file_tree (str): Paths, one per line
+        max_tokens (int): Token budget for the result
+
+    Returns:
+        str: The tree in the compact format, summarized as needed
+    """
+
+    def fits(text):
+        return estimate_tokens(text).upper <= max_tokens
+
+    compact = compact_file_tree(file_tree)
+    if fits(compact):
+        return compact
+
+    root = _build_trie(file_tree)
+    summaries: dict = {}
+    trimmed = _render_summarized(root, None, True, True, summaries)
+    if fits(trimmed):
+        return trimmed
+
+    # Deepest level that fits; shallower renders are never larger
+    low, high = 1, max(1, _depth(root))
+    best = _render_summarized(root, low, True, True, summaries)
+    while low < high:
+        middle = (low + high + 1) // 2
+        rendered = _render_summarized(root, middle, True, True, summaries)
+        if fits(rendered):
+            low, best = middle, rendered
+        else:
+            high = middle - 1
+    return best
+
+
+def format_file_tree(file_tree: str) -> str:
+    """Writes a file tree in the format configured by FILE_TREE_FORMAT."""
+    if FILE_TREE_FORMAT == "compact":
+        return compact_file_tree(file_tree)
+    return file_tree
@@ -25,3 +25,58 @@ def format_user_message(data: dict[str, str]) -> str:
             parts.append(f"<diagram>\n{value}\n</diagram>")
 
     return "\n\n".join(parts)
+
+
+# Blocks that are the same for every phase and request of a repository, in
+# the order they open the prompt. Largest first, phase 2 sends only the tree
+SHARED_CONTEXT_KEYS = ("file_tree", "readme")
+
+
+def format_prompt_messages(
+    system_prompt: str, data: dict[str, str], system_role: bool = True
+) -> list[dict[str, str]]:
+    """
+    Builds chat messages so the large blocks shared between phases and
+    requests come first, each in its own message, and everything that varies
+    follows them. OpenAI and DeepSeek cache prompt prefixes automatically,
+    so a file tree sent by phase 1 is a cache hit for phase 2 and for the
+    next request for the same repository:
+
+        <file_tree>   shared by phases 1 and 2
+        <readme>      phase 1
+        phase prompt
+        explanation, instructions, ... of the phase
+
+    Args:
+        system_prompt (str): The phase's instructions
+        data (dict[str, str]): Variables of the phase, formatted like
+            format_user_message
+        system_role (bool): Send the instructions as a system message. For
+            models whose chat template moves system messages to the front
+            of the prompt, e.g. DeepSeek, or that have none, they are sent
+            as a user message instead
+
+    Returns:
+        list[dict[str, str]]: Messages for a chat completions request
+    """
+    messages = [
+        {"role": "user", "content": format_user_message({key: data[key]})}
+        for key in SHARED_CONTEXT_KEYS
+        if key in data
+    ]
+    rest = format_user_message(
+        {key: value for key, value in data.items() if key not in SHARED_CONTEXT_KEYS}
+    )
+    if system_role:
+        messages.append({"role": "system", "content": system_prompt})
+        if rest:
+            messages.append({"role": "user", "content": rest})
+    else:
+        instructions = (
+            f"<VERY_IMPORTANT_SYSTEM_INSTRUCTIONS>\n{system_prompt}\n"
+            "</VERY_IMPORTANT_SYSTEM_INSTRUCTIONS>"
+        )
+        messages.append(
+            {"role": "user", "content": f"{instructions}\n\n{rest}" if rest else instructions}
+        )
+    return messages
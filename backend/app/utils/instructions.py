@@ -0,0 +1,43 @@
+import re
+
+# Words of instructions about how the diagram is drawn
+_PRESENTATION = re.compile(
+    r"\b(colou?rs?|colou?rful|styles?|styling|theme|dark|light|themed|layout|"
+    r"direction|horizontal(ly)?|vertical(ly)?|left[- ]to[- ]right|"
+    r"top[- ]to[- ]bottom|LR|TB|TD|shapes?|rounded|fonts?|labels?|arrows?|"
+    r"lines?|edges?|spacing|compact|bigger|smaller|icons?|emojis?|"
+    r"legend|readable|clean(er)?|pretty|prettier|nicer|look|looks|visual(ly)?)\b",
+    re.IGNORECASE,
+)
+# Words of instructions about what the diagram covers, which phase 1 has to
+# take into account when explaining the project
+_SCOPE = re.compile(
+    r"\b(focus(es|ed|ing)?|only|include|including|exclude|excluding|ignore|"
+    r"skip|omit|without|add|remove|show|hide|more|less|detail(s|ed)?|"
+    r"component|module|service|package|folder|director(y|ies)|files?|"
+    r"class(es)?|functions?|api|database|backend|frontend|flow|pipeline|"
+    r"architecture|explain|why|how)\w*\b",
+    re.IGNORECASE,
+)
+
+
+def is_presentation_only(instructions: str) -> bool:
+    """
+    Returns True if instructions only ask to change how the diagram looks,
+    e.g. "use a dark color scheme" or "lay it out left to right", and say
+    nothing about which parts of the project it covers.
+
+    Such instructions only matter to the diagram phase. The explanation and
+    component mapping are the same as without instructions, so they can be
+    reused from a run that had none. Anything unrecognized counts as
+    changing the content.
+
+    Args:
+        instructions (str): The user's custom instructions
+
+    Returns:
+        bool: Whether the instructions are about presentation only
+    """
+    return bool(_PRESENTATION.search(instructions)) and not _SCOPE.search(
+        instructions
+    )
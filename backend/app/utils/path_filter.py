@@ -0,0 +1,150 @@
+from dotenv import load_dotenv
+from typing import Iterable
+import hashlib
+import os
+import re
+
+load_dotenv()
+
+# Paths that say little about a project's architecture
+DEFAULT_EXCLUDE_RULES = [
+    # Dependencies
+    "node_modules/",
+    "vendor/",
+    "venv/",
+    # Compiled files
+    "*.min.*",
+    "*.pyc",
+    "*.pyo",
+    "*.pyd",
+    "*.so",
+    "*.dll",
+    "*.class",
+    # Asset files
+    "*.jpg",
+    "*.jpeg",
+    "*.png",
+    "*.gif",
+    "*.ico",
+    "*.svg",
+    "*.ttf",
+    "*.woff",
+    "*.webp",
+    # Cache and temporary files
+    "__pycache__/",
+    ".cache/",
+    ".tmp/",
+    # Lock files and logs
+    "yarn.lock",
+    "poetry.lock",
+    "*.log",
+    # Configuration files
+    ".vscode/",
+    ".idea/",
+]
+
+
+# Compiled in place of an empty rule set
+_NEVER = re.compile(r"(?!)")
+
+
+def _alternation(parts: list[str]) -> str:
+    return "|".join(re.escape(part) for part in parts)
+
+
+class PathFilter:
+    """
+    Decides which repository paths are worth sending to the model.
+
+    Exclude rules use a small glob-like syntax, matched case-insensitively:
+        "name/"   a directory anywhere in the path, with everything below it
+        "*.ext"   a file name suffix
+        "*text*"  text anywhere in the file name
+        "name"    an exact file name
+
+    All rules are compiled into two regular expressions when the filter is
+    built: one for directory segments, evaluated once per distinct directory,
+    and one for the final path component.
+    """
+
+    def __init__(self, rules: Iterable[str] = DEFAULT_EXCLUDE_RULES):
+        dirs, suffixes, substrings, names = [], [], [], []
+        normalized = []
+        for rule in rules:
+            rule = rule.strip().lower()
+            if not rule:
+                continue
+            normalized.append(rule)
+            if rule.endswith("/"):
+                dirs.append(rule.rstrip("/"))
+            elif rule.startswith("*") and rule.endswith("*") and len(rule) > 2:
+                substrings.append(rule[1:-1])
+            elif rule.startswith("*"):
+                suffixes.append(rule[1:])
+            else:
+                names.append(rule)
+
+        # Identifies the rule set, e.g. to tell trees filtered by other rules apart
+        self.fingerprint = hashlib.sha256(
+            "\n".join(normalized).encode("utf-8")
+        ).hexdigest()[:16]
+
+        self._dir_pattern = (
+            re.compile(rf"(?:^|/)(?:{_alternation(dirs)})(?:/|$)", re.IGNORECASE)
+            if dirs
+            else _NEVER
+        )
+
+        # Directory entries of the tree itself are matched by name as well
+        name_parts = []
+        if suffixes:
+            name_parts.append(rf"(?:{_alternation(suffixes)})$")
+        if names or dirs:
+            name_parts.append(rf"^(?:{_alternation(names + dirs)})$")
+        if substrings:
+            name_parts.append(_alternation(substrings))
+        self._name_pattern = (
+            re.compile("|".join(name_parts), re.IGNORECASE) if name_parts else _NEVER
+        )
+
+    def includes(self, path: str) -> bool:
+        """Returns True if path should be kept."""
+        directory, _, name = path.rpartition("/")
+        return not (
+            self._dir_pattern.search(directory) or self._name_pattern.search(name)
+        )
+
+    def filter(
+        self, paths: Iterable[str], dir_cache: dict[str, bool] | None = None
+    ) -> list[str]:
+        """
+        Returns the paths to keep, in their original order.
+
+        Files far outnumber directories, so the directory decision is
+        memoized for the duration of the call.
+
+        Args:
+            paths (Iterable[str]): Repository paths
+            dir_cache (dict[str, bool] | None): Directory memo to reuse, so a
+                tree filtered in batches shares it across calls
+        """
+        excluded_dirs = {} if dir_cache is None else dir_cache
+        search_dir = self._dir_pattern.search
+        search_name = self._name_pattern.search
+        kept = []
+        for path in paths:
+            directory, _, name = path.rpartition("/")
+            excluded = excluded_dirs.get(directory)
+            if excluded is None:
+                excluded = excluded_dirs[directory] = search_dir(directory) is not None
+            if not excluded and search_name(name) is None:
+                kept.append(path)
+        return kept
+
+
+# Comma separated rules appended to the defaults, e.g. "dist/,*.snap"
+PATH_FILTER_EXTRA_RULES = os.getenv("PATH_FILTER_EXTRA_RULES", "")
+
+default_path_filter = PathFilter(
+    DEFAULT_EXCLUDE_RULES + PATH_FILTER_EXTRA_RULES.split(",")
+)
@@ -0,0 +1,210 @@
+from app.utils.token_counter import count_tokens, get_encoding
+from dataclasses import dataclass
+from dotenv import load_dotenv
+import os
+import re
+
+load_dotenv()
+
+# Token budget for the README sent to the model, 0 for no budget
+README_TOKEN_BUDGET = int(os.getenv("README_TOKEN_BUDGET", "8000"))
+# Code blocks longer than this are cut down to their first lines
+CODE_BLOCK_MAX_LINES = 25
+
+_FENCE = re.compile(r"^\s{0,3}(```|~~~)")
+_HEADING = re.compile(r"^\s{0,3}(#{1,6})\s+(.*?)\s*#*\s*$")
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.DOTALL)
+_IMAGE = re.compile(r"!\[[^\]]*\]\([^)]*\)|!\[[^\]]*\]\[[^\]]*\]")
+_EMPTY_LINK = re.compile(r"\[\s*\]\([^)]*\)|\[\s*\]\[[^\]]*\]")
+_LINK_DEFINITION = re.compile(r"^\s{0,3}\[[^\]]+\]:\s*\S+.*$")
+# Markup only: the text between tags is kept
+_HTML_TAG = re.compile(
+    r"</?(?:a|p|div|span|img|br|hr|h[1-6]|picture|source|b|i|u|strong|em|sub|sup|"
+    r"details|summary|table|thead|tbody|tr|td|th|center|kbd|ul|ol|li|video|svg|path)"
+    r"\b[^>]*>",
+    re.IGNORECASE,
+)
+
+# Sections by title, in the order they are given up when over budget
+_DROPPED_SECTIONS = re.compile(
+    r"change ?log|release notes|history|license|licence|contributors|"
+    r"acknowledg|sponsor|backers|star history|citation|cite|code of conduct|"
+    r"donat|support (the|this) project|thank|table of contents|^contents$",
+    re.IGNORECASE,
+)
+_LOW_PRIORITY_SECTIONS = re.compile(
+    r"install|setup|set up|getting started|quick ?start|usage|example|faq|"
+    r"contribut|develop|testing|tests|troubleshoot|roadmap|todo|deploy|"
+    r"configuration|options|\bcli\b|commands|api reference|screenshot|demo",
+    re.IGNORECASE,
+)
+_HIGH_PRIORITY_SECTIONS = re.compile(
+    r"overview|architecture|design|how it works|components|structure|about|"
+    r"features|introduction|concepts|modules|internals",
+    re.IGNORECASE,
+)
+
+
+@dataclass
+class ReducedReadme:
+    """A README reduced for the prompt, with the token counts before and after."""
+
+    text: str
+    original_tokens: int
+    tokens: int
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.original_tokens - self.tokens
+
+
+@dataclass
+class _Section:
+    title: str
+    lines: list[str]
+    # Under the document's title heading, e.g. "# ProjectName"
+    is_title: bool = False
+
+    @property
+    def priority(self) -> int:
+        """
+        0 is kept longest. The text before the first heading, often just
+        badges, and the section under the title hold the introduction.
+        """
+        if not self.title or self.is_title:
+            return 0
+        if _HIGH_PRIORITY_SECTIONS.search(self.title):
+            return 1
+        if _LOW_PRIORITY_SECTIONS.search(self.title):
+            return 3
+        return 2
+
+
+def _clean_prose(line: str) -> str:
+    line = _IMAGE.sub("", line)
+    line = _HTML_TAG.sub("", line)
+    return _EMPTY_LINK.sub("", line)
+
+
+def _sections(readme: str) -> list[_Section]:
+    """
+    Splits the README at its headings, dropping sections nobody needs to
+    understand the architecture and cleaning markup outside code blocks.
+    """
+    sections = [_Section("", [])]
+    code_block: list[str] | None = None
+    dropped_level = 0
+
+    for line in _HTML_COMMENT.sub("", readme).splitlines():
+        if code_block is not None:
+            code_block.append(line)
+            if _FENCE.match(line):
+                if len(code_block) > CODE_BLOCK_MAX_LINES + 2:
+                    omitted = len(code_block) - CODE_BLOCK_MAX_LINES - 2
+                    code_block[CODE_BLOCK_MAX_LINES + 1 : -1] = [
+                        f"... ({omitted} more lines)"
+                    ]
+                if not dropped_level:
+                    sections[-1].lines.extend(code_block)
+                code_block = None
+            continue
+        if _FENCE.match(line):
+            code_block = [line]
+            continue
+
+        heading = _HEADING.match(line)
+        if heading:
+            level = len(heading.group(1))
+            title = _clean_prose(heading.group(2)).strip()
+            # Subsections of a dropped section are dropped with it
+            if dropped_level and level > dropped_level:
+                continue
+            dropped_level = level if _DROPPED_SECTIONS.search(title) else 0
+            if not dropped_level:
+                # A leading H1 names the project, unless it is a how-to
+                # section in a README written with H1s throughout
+                is_title = (
+                    len(sections) == 1
+                    and level == 1
+                    and not _LOW_PRIORITY_SECTIONS.search(title)
+                )
+                sections.append(_Section(title, [line], is_title))
+            continue
+
+        if dropped_level or _LINK_DEFINITION.match(line):
+            continue
+        line = _clean_prose(line)
+        if line.strip() or (sections[-1].lines and sections[-1].lines[-1].strip()):
+            sections[-1].lines.append(line.rstrip())
+
+    # An unclosed fence runs to the end of the file
+    if code_block is not None and not dropped_level:
+        sections[-1].lines.extend(code_block[: CODE_BLOCK_MAX_LINES + 1])
+    return [section for section in sections if any(line.strip() for line in section.lines)]
+
+
+def _fragment_tokens(text: str) -> int:
+    # Sections and lines are counted once and never again, so they bypass
+    # the count_tokens memo instead of evicting the tree and README counts
+    return len(get_encoding().encode(text, disallowed_special=()))
+
+
+def _truncate(lines: list[str], max_tokens: int) -> list[str]:
+    """Keeps the leading lines of a section that fit max_tokens."""
+    kept: list[str] = []
+    tokens = 0
+    for line in lines:
+        tokens += _fragment_tokens(line) + 1
+        if tokens > max_tokens:
+            break
+        kept.append(line)
+    return kept
+
+
+def reduce_readme(readme: str, max_tokens: int = README_TOKEN_BUDGET) -> ReducedReadme:
+    """
+    Reduces a README to what helps explain a project's architecture.
+
+    Badges, images, HTML markup, comments and link definitions are removed,
+    long code blocks are cut down, and changelog, license, contributor and
+    sponsor sections are dropped. If the result is still over max_tokens,
+    whole sections are given up by priority: installation, usage and other
+    how-to sections first, overview and architecture sections and the
+    introduction, before the first heading or under the title, last. The
+    first section that does not fit is truncated, and no section ranked
+    below it is kept.
+
+    Args:
+        readme (str): The README as fetched from the repository
+        max_tokens (int): Token budget, 0 for no budget
+
+    Returns:
+        ReducedReadme: The reduced text with token counts before and after
+    """
+    original_tokens = count_tokens(readme)
+    sections = _sections(readme)
+    texts = ["\n".join(section.lines).strip("\n") for section in sections]
+    costs = [_fragment_tokens(text) + 2 for text in texts]
+
+    if max_tokens and sum(costs) > max_tokens:
+        remaining = max_tokens
+        kept: dict[int, str] = {}
+        for index in sorted(
+            range(len(sections)), key=lambda i: (sections[i].priority, i)
+        ):
+            if costs[index] <= remaining:
+                kept[index] = texts[index]
+                remaining -= costs[index]
+                continue
+            # The first section that does not fit is truncated, and none
+            # ranked below it take its place
+            lines = _truncate(sections[index].lines, remaining - 20)
+            if any(line.strip() for line in lines):
+                kept[index] = "\n".join(lines).strip("\n") + "\n..."
+            break
+        texts = [kept[index] for index in sorted(kept)]
+
+    text = "\n\n".join(texts)
+    return ReducedReadme(
+        text=text, original_tokens=original_tokens, tokens=count_tokens(text)
+    )
@@ -0,0 +1,77 @@
+class SSEDecoder:
+    """
+    Incremental decoder for text/event-stream bodies, fed raw bytes as they
+    arrive from the network.
+
+    Follows the event stream format: lines end with LF, CRLF or CR, a blank
+    line dispatches the event, lines starting with ":" are comments, and
+    several data lines in one event are joined with LF. Frames split across
+    reads are buffered until complete.
+
+    Nothing is decoded to str except event names, JSON parsers take the data
+    as bytes. The common frame, a single "data: ..." line followed by a
+    blank line, is sliced out of the buffer without being split into lines.
+    """
+
+    def __init__(self):
+        self._buffer = b""
+        self._data: list[bytes] = []
+        self._event = ""
+        self._started = False
+
+    def feed(self, chunk: bytes) -> list[tuple[str, bytes]]:
+        """
+        Adds bytes read from the stream and returns the events they complete.
+
+        Args:
+            chunk (bytes): Any slice of the body, e.g. one network read
+
+        Returns:
+            list[tuple[str, bytes]]: (event type, data) of each completed
+                event in stream order, the type "message" unless named
+        """
+        buffer = self._buffer + chunk if self._buffer else chunk
+        if not self._started and buffer:
+            self._started = True
+            if buffer.startswith(b"\xef\xbb\xbf"):
+                buffer = buffer[3:]
+
+        # A trailing CR may be the first half of a CRLF, decide on the next read
+        held_cr = b""
+        if b"\r" in buffer:
+            if buffer.endswith(b"\r"):
+                buffer, held_cr = buffer[:-1], b"\r"
+            buffer = buffer.replace(b"\r\n", b"\n").replace(b"\r", b"\n")
+
+        blocks = buffer.split(b"\n\n")
+        self._buffer = blocks.pop() + held_cr
+        events = []
+        for block in blocks:
+            if block.startswith(b"data: ") and b"\n" not in block:
+                events.append(("message", block[6:]))
+                continue
+            self._parse_lines(block, events)
+            self._dispatch(events)
+        return events
+
+    def _parse_lines(self, block: bytes, events: list[tuple[str, bytes]]):
+        for line in block.split(b"\n"):
+            if not line:
+                self._dispatch(events)
+                continue
+            if line[0] == 0x3A:  # ":" starts a comment, e.g. a keep-alive
+                continue
+            field, colon, value = line.partition(b":")
+            if colon and value[:1] == b" ":
+                value = value[1:]
+            if field == b"data":
+                self._data.append(value)
+            elif field == b"event":
+                self._event = value.decode("utf-8", "replace")
+            # id and retry only matter for reconnecting, which we never do
+
+    def _dispatch(self, events: list[tuple[str, bytes]]):
+        if self._data:
+            events.append((self._event or "message", b"\n".join(self._data)))
+        self._data = []
+        self._event = ""
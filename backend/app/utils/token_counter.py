@@ -0,0 +1,228 @@
+import asyncio
+import math
+import os
+import statistics
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterable
+
+import tiktoken
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Encoding of the OpenAI models, also used to size DeepSeek requests
+ENCODING_NAME = "o200k_base"
+# Inputs longer than this many characters are encoded off the event loop
+OFFLOAD_THRESHOLD_CHARS = 64 * 1024
+# Token counts remembered per worker, keyed by content hash
+MEMO_MAX_ENTRIES = 1024
+# Threads for encoding large inputs; tiktoken releases the GIL while encoding
+TOKEN_COUNT_WORKERS = int(os.getenv("TOKEN_COUNT_WORKERS", "2"))
+# Sampling of large inputs for estimate_tokens: evenly spaced blocks of
+# whole lines, about ESTIMATE_SAMPLE_BLOCKS * ESTIMATE_BLOCK_CHARS encoded
+ESTIMATE_SAMPLE_BLOCKS = 32
+ESTIMATE_BLOCK_CHARS = 1024
+# Width of the bounds: standard errors of the sampled tokens per character,
+# plus a relative slack for what sampling cannot see (merges across block
+# edges, rare content the blocks miss)
+ESTIMATE_Z = 4.0
+ESTIMATE_SLACK = 0.03
+
+_encoding: tiktoken.Encoding | None = None
+_encoding_lock = threading.Lock()
+_counts: OrderedDict[tuple[int, int], int] = OrderedDict()
+_counts_lock = threading.Lock()
+# Kept apart from the default executor so long encodes never delay the
+# short disk reads other code runs through asyncio.to_thread
+_executor = ThreadPoolExecutor(
+    max_workers=TOKEN_COUNT_WORKERS, thread_name_prefix="token-count"
+)
+
+
+def get_encoding() -> tiktoken.Encoding:
+    """Returns the shared o200k_base encoder, loading it on first use."""
+    global _encoding
+    if _encoding is None:
+        with _encoding_lock:
+            if _encoding is None:
+                _encoding = tiktoken.get_encoding(ENCODING_NAME)
+    return _encoding
+
+
+def _digest(text: str) -> tuple[int, int]:
+    # The memo never leaves the process, so the built-in string hash is
+    # enough and several times faster than encoding and hashing the bytes
+    return len(text), hash(text)
+
+
+def _remember(digest: tuple[int, int], count: int):
+    with _counts_lock:
+        _counts[digest] = count
+        _counts.move_to_end(digest)
+        if len(_counts) > MEMO_MAX_ENTRIES:
+            _counts.popitem(last=False)
+
+
+def _recall(digest: tuple[int, int]) -> int | None:
+    with _counts_lock:
+        count = _counts.get(digest)
+        if count is not None:
+            _counts.move_to_end(digest)
+        return count
+
+
+def _encode_and_count(text: str, digest: tuple[int, int]) -> int:
+    count = len(get_encoding().encode(text, disallowed_special=()))
+    _remember(digest, count)
+    return count
+
+
+def count_tokens(text: str) -> int:
+    """
+    Counts the o200k_base tokens in text. Counts are memoized by content
+    hash, so the same file tree or README is only encoded once per worker.
+
+    Args:
+        text (str): Text to count tokens for
+
+    Returns:
+        int: Number of tokens
+    """
+    digest = _digest(text)
+    count = _recall(digest)
+    return count if count is not None else _encode_and_count(text, digest)
+
+
+async def count_tokens_async(text: str) -> int:
+    """
+    Like count_tokens, but encodes large inputs in a worker thread so
+    multi-megabyte file trees don't block the event loop.
+    """
+    if len(text) < OFFLOAD_THRESHOLD_CHARS:
+        return count_tokens(text)
+    digest = _digest(text)
+    count = _recall(digest)
+    if count is not None:
+        return count
+    return await asyncio.get_running_loop().run_in_executor(
+        _executor, _encode_and_count, text, digest
+    )
+
+
+@dataclass(frozen=True)
+class TokenEstimate:
+    """
+    Bounds on a token count, equal when it was counted exactly. Estimates
+    add and scale like counts, so bounds for a formula over several inputs
+    follow from the bounds of each input.
+    """
+
+    lower: int
+    upper: int
+
+    @classmethod
+    def exact(cls, count: int) -> "TokenEstimate":
+        return cls(count, count)
+
+    @property
+    def is_exact(self) -> bool:
+        return self.lower == self.upper
+
+    @property
+    def value(self) -> int:
+        """Best single guess, always within the bounds."""
+        return (self.lower + self.upper) // 2
+
+    def straddles(self, threshold: int) -> bool:
+        """True if the bounds cannot tell which side of threshold the count is on."""
+        return not self.is_exact and self.lower <= threshold <= self.upper
+
+    def __add__(self, other: "TokenEstimate | int") -> "TokenEstimate":
+        if isinstance(other, int):
+            return TokenEstimate(self.lower + other, self.upper + other)
+        return TokenEstimate(self.lower + other.lower, self.upper + other.upper)
+
+    __radd__ = __add__
+
+    def __mul__(self, factor: int) -> "TokenEstimate":
+        return TokenEstimate(self.lower * factor, self.upper * factor)
+
+    __rmul__ = __mul__
+
+
+def estimate_tokens(text: str) -> TokenEstimate:
+    """
+    Bounds the token count of text in a few milliseconds whatever its size.
+
+    Small or already counted inputs get their exact count. Larger ones are
+    sampled: evenly spaced blocks of whole lines are encoded and their
+    tokens per character extrapolated to the whole text, with bounds from
+    the spread between blocks.
+
+    Args:
+        text (str): Text to estimate the token count of
+
+    Returns:
+        TokenEstimate: Lower and upper bound of the count
+    """
+    if len(text) < OFFLOAD_THRESHOLD_CHARS:
+        return TokenEstimate.exact(count_tokens(text))
+    count = _recall(_digest(text))
+    if count is not None:
+        return TokenEstimate.exact(count)
+
+    encoding = get_encoding()
+    step = len(text) / ESTIMATE_SAMPLE_BLOCKS
+    ratios = []
+    sampled_chars = sampled_tokens = 0
+    for i in range(ESTIMATE_SAMPLE_BLOCKS):
+        start = int(i * step)
+        if start:
+            start = text.find("\n", start, start + ESTIMATE_BLOCK_CHARS) + 1 or start
+        end = text.find(
+            "\n", start + ESTIMATE_BLOCK_CHARS, start + 4 * ESTIMATE_BLOCK_CHARS
+        )
+        block = text[start : end if end != -1 else start + 4 * ESTIMATE_BLOCK_CHARS]
+        if not block:
+            continue
+        tokens = len(encoding.encode(block, disallowed_special=()))
+        ratios.append(tokens / len(block))
+        sampled_chars += len(block)
+        sampled_tokens += tokens
+
+    ratio = sampled_tokens / sampled_chars
+    spread = statistics.stdev(ratios) / math.sqrt(len(ratios)) if len(ratios) > 1 else ratio
+    margin = ESTIMATE_Z * spread + ESTIMATE_SLACK * ratio
+    return TokenEstimate(
+        max(0, math.floor((ratio - margin) * len(text))),
+        math.ceil((ratio + margin) * len(text)),
+    )
+
+
+async def bounded_token_count(
+    parts: list[str],
+    combine: Callable[..., TokenEstimate],
+    thresholds: Iterable[int],
+) -> TokenEstimate:
+    """
+    Bounds a token count derived from several inputs just tightly enough to
+    decide which side of each threshold it falls on. The inputs are only
+    encoded in full when their estimates straddle a threshold.
+
+    Args:
+        parts (list[str]): Inputs to count
+        combine (Callable[..., TokenEstimate]): Derives the count from one
+            estimate per part, e.g. lambda tree, readme: tree + readme
+        thresholds (Iterable[int]): Token counts the caller compares against
+
+    Returns:
+        TokenEstimate: The combined count, exact if an estimate was not enough
+    """
+    estimate = combine(*(estimate_tokens(part) for part in parts))
+    if any(estimate.straddles(threshold) for threshold in thresholds):
+        counts = [await count_tokens_async(part) for part in parts]
+        estimate = combine(*(TokenEstimate.exact(count) for count in counts))
+    return estimate
@@ -0,0 +1,52 @@
+import json
+import re
+
+# In valid JSON this byte sequence can only be an object key followed by a
+# string value: quotes inside strings are always escaped. GitHub writes the
+# type after the path, and no other value of an entry contains braces, so
+# the match never runs into the next entry.
+_PATH_ENTRY = re.compile(
+    rb'"path"\s*:\s*"([^"\\]*(?:\\.[^"\\]*)*)"[^{}]*?"type"\s*:\s*"(\w+)"'
+)
+_TRUNCATED = re.compile(rb'"truncated"\s*:\s*(true|false)')
+
+
+class TreePathParser:
+    """
+    Incrementally extracts entry paths from a GitHub git/trees response body.
+
+    Feed it the raw body chunk by chunk as it arrives from the network. Only
+    the bytes after the last complete entry are retained between chunks, so
+    the full document is never held in memory or turned into Python objects.
+    """
+
+    def __init__(self):
+        self._pending = b""
+        self.truncated = False
+
+    def feed(self, chunk: bytes) -> list[str]:
+        """
+        Returns the paths of all entries completed by this chunk. Directory
+        paths end with "/", so they can be told apart from files once their
+        contents are filtered out.
+        """
+        buffer = self._pending + chunk if self._pending else chunk
+        paths = []
+        end = 0
+        for match in _PATH_ENTRY.finditer(buffer):
+            raw = match.group(1)
+            # Escaped paths are rare, let the JSON decoder handle them
+            path = json.loads(b'"' + raw + b'"') if b"\\" in raw else raw.decode("utf-8")
+            paths.append(path + "/" if match.group(2) == b"tree" else path)
+            end = match.end()
+        self._pending = buffer[end:]
+        return paths
+
+    def close(self):
+        """
+        Finishes parsing. The truncated flag follows the tree array, so it is
+        only known once the whole body has been fed.
+        """
+        match = _TRUNCATED.search(self._pending)
+        self.truncated = bool(match) and match.group(1) == b"true"  # type: ignore
+        self._pending = b""
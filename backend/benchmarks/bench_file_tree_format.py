@@ -0,0 +1,38 @@
+"""
+Measures how many prompt tokens the compact file tree format saves over
+one full path per line, and how long the conversion takes.
+
+Needs the o200k_base encoding, which tiktoken downloads on first use.
+
+Run from the backend directory:
+    python -m benchmarks.bench_file_tree_format [num_paths]
+"""
+
+import sys
+import time
+
+from app.utils.file_tree_format import compact_file_tree
+from app.utils.path_filter import default_path_filter
+from app.utils.token_counter import get_encoding
+from benchmarks.synthetic import synthetic_tree
+
+
+def main():
+    num_paths = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    file_tree = "\n".join(default_path_filter.filter(synthetic_tree(num_paths)))
+    encoding = get_encoding()
+
+    start = time.perf_counter()
+    compact = compact_file_tree(file_tree)
+    seconds = time.perf_counter() - start
+
+    before = len(encoding.encode(file_tree, disallowed_special=()))
+    after = len(encoding.encode(compact, disallowed_special=()))
+    print(f"entries:   {file_tree.count(chr(10)) + 1:,} after filtering")
+    print(f"paths:     {before:,} tokens, {len(file_tree):,} chars")
+    print(f"compact:   {after:,} tokens, {len(compact):,} chars, built in {seconds * 1000:.1f}ms")
+    print(f"reduction: {1 - after / before:.0%} fewer tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Times the time to first token of three streamed phases in a row, opening a
+new aiohttp session per phase as the LLM services used to, against the
+pooled provider session from get_llm_session. The provider is a local TLS
+server streaming server-sent events, so the run needs no network; against
+a real provider every avoided connection setup also saves its round trips.
+
+Run from the backend directory:
+    python -m benchmarks.bench_llm_session [generations]
+"""
+
+import asyncio
+import datetime
+import os
+import ssl
+import statistics
+import sys
+import tempfile
+import time
+
+import aiohttp
+from aiohttp import web
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.x509.oid import NameOID
+
+from app.core.http_pool import close_llm_sessions, get_llm_session
+
+PHASES = 3
+
+
+def self_signed_context(directory: str) -> tuple[ssl.SSLContext, ssl.SSLContext]:
+    """Returns server and client TLS contexts for a certificate for localhost."""
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "localhost")])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    certificate = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]), False)
+        .sign(key, hashes.SHA256())
+    )
+    cert_path = os.path.join(directory, "cert.pem")
+    key_path = os.path.join(directory, "key.pem")
+    with open(cert_path, "wb") as f:
+        f.write(certificate.public_bytes(serialization.Encoding.PEM))
+    with open(key_path, "wb") as f:
+        f.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.TraditionalOpenSSL,
+                serialization.NoEncryption(),
+            )
+        )
+
+    server = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    server.load_cert_chain(cert_path, key_path)
+    client = ssl.create_default_context(cafile=cert_path)
+    return server, client
+
+
+async def completions(request: web.Request) -> web.StreamResponse:
+    await request.read()
+    response = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+    await response.prepare(request)
+    for i in range(20):
+        await response.write(
+            f'data: {{"choices":[{{"delta":{{"content":"token {i} "}}}}]}}\n\n'.encode()
+        )
+    await response.write(b"data: [DONE]\n\n")
+    await response.write_eof()
+    return response
+
+
+async def first_token(session: aiohttp.ClientSession, url: str, context) -> float:
+    """Streams one completion and returns the seconds until its first chunk."""
+    start = time.perf_counter()
+    ttft = None
+    async with session.post(url, json={"stream": True}, ssl=context) as response:
+        async for line in response.content:
+            if ttft is None and line.startswith(b"data: "):
+                ttft = time.perf_counter() - start
+    return ttft
+
+
+async def run(generations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        server_context, client_context = self_signed_context(directory)
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", completions)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "localhost", 0, ssl_context=server_context)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        url = f"https://localhost:{port}/v1/chat/completions"
+
+        per_call = []
+        for _ in range(generations):
+            for _ in range(PHASES):
+                async with aiohttp.ClientSession() as session:
+                    per_call.append(await first_token(session, url, client_context))
+
+        pooled = []
+        for _ in range(generations):
+            for _ in range(PHASES):
+                session = get_llm_session("bench")
+                pooled.append(await first_token(session, url, client_context))
+
+        await close_llm_sessions()
+        await runner.cleanup()
+
+    print(f"phases:                {generations * PHASES:,}")
+    for label, times in (("session per call", per_call), ("pooled session", pooled)):
+        print(
+            f"{label + ':':<22} p50 {statistics.median(times) * 1000:6.2f}ms"
+            f"   max {max(times) * 1000:6.2f}ms"
+        )
+
+
+def main():
+    generations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    asyncio.run(run(generations))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Times reading a repository snapshot from a local bare mirror with
+LocalGitService, the source used when REPO_SOURCE=local. The mirror is built
+from the synthetic tree with git fast-import, so the run needs no network.
+
+Run from the backend directory:
+    python -m benchmarks.bench_local_source [num_paths]
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from app.services.local_git_service import LocalGitService
+from benchmarks.synthetic import synthetic_tree
+
+
+def build_mirror(root: str, paths: list[str]):
+    """Creates <root>/octocat/monorepo.git with one commit containing paths."""
+    repo = os.path.join(root, "octocat", "monorepo.git")
+    subprocess.run(["git", "init", "-q", "--bare", "-b", "main", repo], check=True)
+
+    readme = b"# Monorepo\n\nSynthetic repository for benchmarks.\n"
+    stream = [
+        b"blob\nmark :1\ndata 0\n\n",
+        b"blob\nmark :2\n",
+        f"data {len(readme)}\n".encode() + readme + b"\n",
+        b"commit refs/heads/main\n",
+        b"committer Bench <bench@example.com> 0 +0000\n",
+        b"data 10\nsynthetic\n\n",
+        b"M 100644 :2 README.md\n",
+    ]
+    stream += [f"M 100644 :1 {path}\n".encode() for path in paths]
+    subprocess.run(
+        ["git", "-C", repo, "fast-import", "--quiet"],
+        input=b"".join(stream),
+        check=True,
+    )
+
+
+async def snapshot(service: LocalGitService):
+    commit_sha, _ = await service.get_head_commit("octocat", "monorepo")
+    return await service.get_repo_snapshot("octocat", "monorepo", ref=commit_sha)
+
+
+def main():
+    num_paths = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    paths = synthetic_tree(num_paths)
+
+    with tempfile.TemporaryDirectory() as root:
+        build_mirror(root, paths)
+        service = LocalGitService(root=root)
+
+        runs = []
+        for _ in range(5):
+            start = time.perf_counter()
+            result = asyncio.run(snapshot(service))
+            runs.append(time.perf_counter() - start)
+
+    print(f"paths:     {num_paths:,} ({len(result.file_tree.splitlines()):,} after filtering)")
+    print(f"branch:    {result.default_branch}")
+    print(f"snapshot:  best {min(runs) * 1000:.1f}ms, worst {max(runs) * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
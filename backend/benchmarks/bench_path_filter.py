@@ -0,0 +1,49 @@
+"""
+Compares the compiled PathFilter with the substring filter it replaced.
+
+Run from the backend directory:
+    python -m benchmarks.bench_path_filter [num_paths]
+"""
+
+import sys
+import time
+
+from app.utils.path_filter import default_path_filter
+from benchmarks.synthetic import synthetic_tree
+
+# The filter GitHubService used before PathFilter, kept verbatim for comparison
+LEGACY_EXCLUDED_PATTERNS = [
+    "node_modules/", "vendor/", "venv/", ".min.", ".pyc", ".pyo", ".pyd", ".so",
+    ".dll", ".class", ".jpg", ".jpeg", ".png", ".gif", ".ico", ".svg", ".ttf",
+    ".woff", ".webp", "__pycache__/", ".cache/", ".tmp/", "yarn.lock",
+    "poetry.lock", "*.log", ".vscode/", ".idea/",
+]
+
+
+def legacy_should_include_file(path):
+    return not any(pattern in path.lower() for pattern in LEGACY_EXCLUDED_PATTERNS)
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main():
+    num_paths = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    paths = synthetic_tree(num_paths)
+
+    legacy, legacy_seconds = timed(
+        lambda: [path for path in paths if legacy_should_include_file(path)]
+    )
+    compiled, compiled_seconds = timed(lambda: default_path_filter.filter(paths))
+
+    print(f"paths:    {num_paths:,}")
+    print(f"legacy:   {legacy_seconds:.3f}s ({len(legacy):,} kept)")
+    print(f"compiled: {compiled_seconds:.3f}s ({len(compiled):,} kept)")
+    print(f"speedup:  {legacy_seconds / compiled_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
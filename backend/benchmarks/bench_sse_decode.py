@@ -0,0 +1,168 @@
+"""
+Times decoding a streamed chat completion: the per-line loop the provider
+services used to carry (decode, strip, prefix check, json.loads) against the
+shared engine's SSEDecoder with each available JSON parser. Both read the
+body from an aiohttp StreamReader as they do in production, line by line
+and in whatever chunks arrived respectively.
+
+The stream replays the frames of an o4-mini completion as the API sends
+them, with OpenRouter-style keep-alive comments and a final usage chunk,
+cut into network-sized reads.
+
+Run from the backend directory:
+    python -m benchmarks.bench_sse_decode [deltas]
+"""
+
+import asyncio
+import json
+import random
+import sys
+import time
+
+from aiohttp.streams import StreamReader
+
+from app.services.llm_stream import _delta_content, get_json_loads
+from app.utils.sse import SSEDecoder
+
+WORDS = (
+    "flowchart TD subgraph Frontend Backend API click Router Service Cache "
+    "classDef --> end style fill:#f9f,stroke:#333 Database Worker Queue"
+).split()
+
+
+def _frame(chunk: dict) -> bytes:
+    return b"data: " + json.dumps(chunk, separators=(",", ":")).encode() + b"\n\n"
+
+
+def recorded_stream(deltas: int, seed: int = 1) -> bytes:
+    """Returns the body of a streamed completion with deltas content chunks."""
+    rng = random.Random(seed)
+    base = {
+        "id": "chatcmpl-BQ3wM2mZP0fZc9xrT1v7Yk2LxJqQ8",
+        "object": "chat.completion.chunk",
+        "created": 1745600000,
+        "model": "o4-mini-2025-04-16",
+        "service_tier": "default",
+        "system_fingerprint": None,
+    }
+    first_delta = {"role": "assistant", "content": "", "refusal": None}
+    frames = [
+        b": OPENROUTER PROCESSING\n\n",
+        _frame({**base, "choices": [{"index": 0, "delta": first_delta, "finish_reason": None}]}),
+    ]
+    for i in range(deltas):
+        content = (" " if rng.random() < 0.7 else "\n") + rng.choice(WORDS)
+        delta = {"content": content}
+        frames.append(
+            _frame({**base, "choices": [{"index": 0, "delta": delta, "finish_reason": None}]})
+        )
+        if i % 500 == 499:
+            frames.append(b": OPENROUTER PROCESSING\n\n")
+    usage = {"prompt_tokens": 41000, "completion_tokens": deltas, "total_tokens": 41000 + deltas}
+    frames.append(_frame({**base, "choices": [], "usage": usage}))
+    frames.append(b"data: [DONE]\n\n")
+    return b"".join(frames)
+
+
+def network_reads(body: bytes, seed: int = 1) -> list[bytes]:
+    """Cuts body into reads of 200 B to 4 KiB, splitting frames anywhere."""
+    rng = random.Random(seed)
+    reads = []
+    i = 0
+    while i < len(body):
+        size = rng.randint(200, 4096)
+        reads.append(body[i : i + size])
+        i += size
+    return reads
+
+
+class _Protocol:
+    # What StreamReader needs of the connection for flow control
+    _reading_paused = False
+
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self):
+        pass
+
+
+def response_content(reads: list[bytes]) -> StreamReader:
+    """Returns a StreamReader that has received reads, like response.content."""
+    reader = StreamReader(_Protocol(), 2**16, loop=asyncio.get_running_loop())
+    for data in reads:
+        reader.feed_data(data)
+    reader.feed_eof()
+    return reader
+
+
+async def legacy_decode(reader: StreamReader) -> list[str]:
+    """The loop each service carried."""
+    out = []
+    async for line in reader:
+        line = line.decode("utf-8").strip()
+        if line.startswith("data: "):
+            if line == "data: [DONE]":
+                break
+            try:
+                data = json.loads(line[6:])
+                if data.get("choices"):
+                    content = data["choices"][0].get("delta", {}).get("content")
+                    if content:
+                        out.append(content)
+            except json.JSONDecodeError:
+                continue
+    return out
+
+
+async def engine_decode(reader: StreamReader, loads) -> list[str]:
+    """The hot path of stream_chat_completion."""
+    out = []
+    decoder = SSEDecoder()
+    async for received in reader.iter_any():
+        for _, data in decoder.feed(received):
+            if data == b"[DONE]":
+                return out
+            content = _delta_content(loads(data))
+            if content:
+                out.append(content)
+    return out
+
+
+async def best_of(decode, reads: list[bytes], runs: int = 7) -> tuple[float, list[str]]:
+    best = float("inf")
+    for _ in range(runs):
+        reader = response_content(reads)
+        start = time.perf_counter()
+        out = await decode(reader)
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+async def run(deltas: int):
+    body = recorded_stream(deltas)
+    reads = network_reads(body)
+    print(f"stream:                {len(body) / 1e6:.1f} MB, {deltas:,} deltas, {len(reads):,} reads")
+
+    legacy, expected = await best_of(legacy_decode, reads)
+    print(f"per-line json.loads:   {legacy * 1000:7.1f}ms   {legacy / deltas * 1e6:5.2f}us/delta")
+    for name in ("json", "jiter", "orjson"):
+        loads = get_json_loads(name)
+        if name != "json" and loads is json.loads:
+            print(f"{'decoder + ' + name + ':':<22} not installed")
+            continue
+        elapsed, out = await best_of(lambda reader: engine_decode(reader, loads), reads)
+        assert out == expected
+        print(
+            f"{'decoder + ' + name + ':':<22} {elapsed * 1000:7.1f}ms   "
+            f"{elapsed / deltas * 1e6:5.2f}us/delta   {legacy / elapsed:4.1f}x"
+        )
+
+
+def main():
+    deltas = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    asyncio.run(run(deltas))
+
+
+if __name__ == "__main__":
+    main()
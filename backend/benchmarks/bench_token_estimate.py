@@ -0,0 +1,45 @@
+"""
+Compares the time to decide which side of the DeepSeek threshold a large
+file tree falls on: a full o200k_base encode as before, and the sampled
+estimate from estimate_tokens. Also reports how wide the estimate's bounds
+are and whether they contain the exact count.
+
+Needs the o200k_base encoding, which tiktoken downloads on first use.
+
+Run from the backend directory:
+    python -m benchmarks.bench_token_estimate [num_paths]
+"""
+
+import sys
+import time
+
+from app.utils.token_counter import estimate_tokens, get_encoding
+from benchmarks.synthetic import synthetic_tree
+
+
+def main():
+    num_paths = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    file_tree = "\n".join(synthetic_tree(num_paths))
+    encoding = get_encoding()
+
+    start = time.perf_counter()
+    exact = len(encoding.encode(file_tree, disallowed_special=()))
+    exact_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    estimate = estimate_tokens(file_tree)
+    estimate_seconds = time.perf_counter() - start
+
+    half_width = (estimate.upper - estimate.lower) / 2 / exact
+    print(f"input:     {num_paths:,} paths, {len(file_tree) / 2**20:.1f} MiB")
+    print(f"exact:     {exact:,} tokens in {exact_seconds * 1000:.1f}ms")
+    print(
+        f"estimate:  {estimate.lower:,}..{estimate.upper:,} tokens (±{half_width:.1%}) "
+        f"in {estimate_seconds * 1000:.1f}ms"
+    )
+    print(f"contains exact count: {estimate.lower <= exact <= estimate.upper}")
+    print(f"speedup:   {exact_seconds / estimate_seconds:.0f}x")
+
+
+if __name__ == "__main__":
+    main()
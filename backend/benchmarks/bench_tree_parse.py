@@ -0,0 +1,95 @@
+"""
+Compares peak memory and time of turning a recursive git/trees response into
+the filtered file tree string: parsing the whole JSON document as before,
+and streaming the body through TreePathParser as GitHubService does now.
+
+Run from the backend directory:
+    python -m benchmarks.bench_tree_parse [num_entries]
+"""
+
+import io
+import json
+import sys
+import time
+import tracemalloc
+
+from app.services.github_service import TREE_CHUNK_SIZE
+from app.utils.path_filter import default_path_filter
+from app.utils.tree_parser import TreePathParser
+from benchmarks.synthetic import synthetic_tree
+
+
+def tree_response_chunks(num_entries: int) -> list[bytes]:
+    """A git/trees?recursive=1 body shaped like GitHub's, split into network reads."""
+    entries = [
+        {
+            "path": path,
+            "mode": "100644",
+            "type": "blob",
+            "sha": "3b18e512dba79e4c8300dd08aeb37f8e728b8dad",
+            "size": 1024,
+            "url": "https://api.github.com/repos/octocat/monorepo/git/blobs/3b18e512dba79e4c8300dd08aeb37f8e728b8dad",
+        }
+        for path in synthetic_tree(num_entries)
+    ]
+    body = json.dumps(
+        {
+            "sha": "9fb037999f264ba9a7fc6274d15fa3ae2ab98312",
+            "url": "https://api.github.com/repos/octocat/monorepo/git/trees/9fb037999f264ba9a7fc6274d15fa3ae2ab98312",
+            "tree": entries,
+            "truncated": False,
+        },
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return [body[i : i + TREE_CHUNK_SIZE] for i in range(0, len(body), TREE_CHUNK_SIZE)]
+
+
+def parse_whole_document(chunks: list[bytes]) -> str:
+    data = json.loads(b"".join(chunks).decode("utf-8"))
+    paths = default_path_filter.filter(item["path"] for item in data["tree"])
+    return "\n".join(paths)
+
+
+def parse_streaming(chunks: list[bytes]) -> str:
+    parser = TreePathParser()
+    dir_cache: dict[str, bool] = {}
+    file_tree = io.StringIO()
+    for chunk in chunks:
+        for path in default_path_filter.filter(parser.feed(chunk), dir_cache):
+            if file_tree.tell():
+                file_tree.write("\n")
+            file_tree.write(path)
+    parser.close()
+    return file_tree.getvalue()
+
+
+def measure(fn, chunks):
+    # Time without tracing, which slows allocation-heavy code unevenly
+    start = time.perf_counter()
+    result = fn(chunks)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    fn(chunks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def main():
+    num_entries = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    chunks = tree_response_chunks(num_entries)
+    payload_bytes = sum(len(chunk) for chunk in chunks)
+
+    before, before_seconds, before_peak = measure(parse_whole_document, chunks)
+    after, after_seconds, after_peak = measure(parse_streaming, chunks)
+    assert before == after, "streaming parser produced a different file tree"
+
+    print(f"entries:   {num_entries:,} ({payload_bytes / 2**20:.1f} MiB payload)")
+    print(f"before:    {before_seconds:.3f}s, peak {before_peak / 2**20:.1f} MiB")
+    print(f"after:     {after_seconds:.3f}s, peak {after_peak / 2**20:.1f} MiB")
+    print(f"reduction: {before_peak / after_peak:.1f}x peak memory")
+
+
+if __name__ == "__main__":
+    main()
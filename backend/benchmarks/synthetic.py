@@ -0,0 +1,39 @@
+"""
+Synthetic repository data for the benchmarks, generated deterministically so
+runs are comparable.
+"""
+
+import random
+
+_DIR_NAMES = [
+    "src", "lib", "app", "core", "api", "utils", "tests", "docs", "components",
+    "models", "services", "internal", "pkg", "cmd", "fixtures", "assets",
+    "build", "node_modules", "vendor", "__pycache__",
+]
+_EXTENSIONS = [
+    "py", "ts", "tsx", "js", "go", "rs", "java", "md", "json", "yaml",
+    "png", "svg", "pyc", "log", "min.js", "class",
+]
+
+
+def synthetic_tree(num_paths: int, num_dirs: int = 20_000, seed: int = 1) -> list[str]:
+    """
+    Returns num_paths sorted file paths spread over a random directory
+    hierarchy of num_dirs directories, shaped like a large monorepo.
+    """
+    rng = random.Random(seed)
+    dirs = [""]
+    while len(dirs) < num_dirs:
+        parent = rng.choice(dirs)
+        name = rng.choice(_DIR_NAMES)
+        if rng.random() < 0.5:
+            name += str(rng.randint(0, 3))
+        dirs.append(f"{parent}/{name}" if parent else name)
+
+    paths = []
+    for i in range(num_paths):
+        directory = rng.choice(dirs)
+        name = f"file_{i % 5000}.{rng.choice(_EXTENSIONS)}"
+        paths.append(f"{directory}/{name}" if directory else name)
+    paths.sort()
+    return paths
@@ -0,0 +1,86 @@
+import asyncio
+
+import pytest
+
+from app.services import llm_router
+from app.services.llm_router import LLMProvider, LLMRouter
+
+
+def make_router(primary_stream, backup_stream) -> LLMRouter:
+    """A hedging router over two providers, both warm enough to hedge at once."""
+    router = LLMRouter(policy="adaptive", hedging=True)
+    for name, stream in (("primary", primary_stream), ("backup", backup_stream)):
+        router.register(
+            LLMProvider(
+                name=name,
+                model=name,
+                max_tokens=1000,
+                wallet_limit=1000,
+                preferred_up_to=1000 if name == "primary" else 0,
+                accepts_user_key=False,
+                reasoning=False,
+                stream=stream,
+            )
+        )
+        for _ in range(llm_router.LLM_STATS_MIN_SAMPLES):
+            router._stats[name].record(0.01, 100.0, True, "low")
+    return router
+
+
+async def collect(router: LLMRouter, answered: list) -> str:
+    chunks = []
+    async for chunk in router.stream(
+        router.providers[0], "system", {}, None, "low", 10, answered.append
+    ):
+        chunks.append(chunk)
+    return "".join(chunks)
+
+
+def test_hedge_prefers_answer_over_failure_in_same_round(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+    async def run():
+        # Both requests finish on the same event, so the primary's failure
+        # and the backup's first chunk are seen by the same wait
+        release = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, release.set)
+
+        async def failing(system_prompt, data, api_key, reasoning_effort):
+            await release.wait()
+            raise ValueError("primary failed")
+            yield
+
+        async def answering(system_prompt, data, api_key, reasoning_effort):
+            await release.wait()
+            yield "backup "
+            yield "answer"
+
+        router = make_router(failing, answering)
+        answered = []
+        assert await collect(router, answered) == "backup answer"
+        assert [provider.name for provider in answered] == ["backup"]
+        assert router.hedges == 1 and router.hedge_wins == 1
+
+    asyncio.run(run())
+
+
+def test_hedge_raises_primary_error_when_all_fail(monkeypatch):
+    monkeypatch.setattr(llm_router, "LLM_HEDGE_MIN_DELAY_SECONDS", 0.01)
+
+    async def run():
+        release = asyncio.Event()
+        asyncio.get_running_loop().call_later(0.1, release.set)
+
+        def failing(message):
+            async def stream(system_prompt, data, api_key, reasoning_effort):
+                await release.wait()
+                raise ValueError(message)
+                yield
+
+            return stream
+
+        router = make_router(failing("primary failed"), failing("backup failed"))
+        with pytest.raises(ValueError, match="primary failed"):
+            await collect(router, [])
+
+    asyncio.run(run())